@@ -1,18 +1,89 @@
+import asyncio
+import logging
 import os
 import re
-from fastapi import FastAPI, Header, HTTPException
-from pydantic import BaseModel
-from jose import jwt, JWTError
-
-from services.intent_service import extract_intent, detect_attribute
+import time
+from functools import lru_cache
+from typing import Final
+import orjson
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
+import jwt
+
+from services.intent_service import extract_intent_and_attribute, detect_attribute, STOPWORDS, PURE_CATEGORY_WORDS
+from services import data_service
 from services.data_service import resolve_entity, format_attribute_answer
+from services import db
+from services import memory_service
 from services.memory_service import save_message, get_recent_messages
 from services.rag_service import get_rag_items
 from services.llm_service import answer_with_ai
+from services import semantic_cache
+from utils.cache import TTLCache
 
-app = FastAPI()
+# orjson serializes the card-heavy /ask responses several times faster
+# than the stdlib json path.
+app = FastAPI(default_response_class=ORJSONResponse)
 JWT_ALGORITHM = "HS256"
 
+# %s-style args so formatting only happens when the level is enabled.
+# Default INFO keeps the per-request debug lines (and their formatting
+# cost) off the hot path in production; set LOG_LEVEL=DEBUG to see them.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+log = logging.getLogger("anvi.ask")
+
+# Read the secret once at import instead of hitting os.environ per request.
+JWT_SECRET = os.getenv("JWT_SECRET")
+_JWT_ALGORITHMS = [JWT_ALGORITHM]
+
+# The same client token repeats across hundreds of requests within its
+# lifetime; caching verified payloads trades one dict lookup for an
+# HMAC-SHA256 + JSON parse per request. Entries live at most 60s and
+# never past the token's own exp, so expiry is still enforced.
+_TOKEN_CACHE = TTLCache(maxsize=4096, ttl=60)
+
+
+async def _decode_token(token: str) -> dict:
+    """Decode and verify a bearer token. Raises jwt.InvalidTokenError on failure."""
+    payload = _TOKEN_CACHE.get(token)
+    if payload is not None:
+        return payload
+    # The HMAC verify is synchronous CPU work; on a cache miss run it in a
+    # worker thread so a burst of first-seen tokens can't stall the loop.
+    payload = await asyncio.to_thread(
+        jwt.decode, token, JWT_SECRET, algorithms=_JWT_ALGORITHMS
+    )
+    exp = payload.get("exp")
+    if exp is not None:
+        remaining = float(exp) - time.time()
+        if remaining <= 0:
+            raise jwt.ExpiredSignatureError("token expired")
+        _TOKEN_CACHE.set(token, payload, ttl=min(60.0, remaining))
+    else:
+        _TOKEN_CACHE.set(token, payload)
+    return payload
+
+
+# ---------------- LIFECYCLE ----------------
+@app.on_event("startup")
+async def _startup():
+    # JWT_SECRET is read once at import; fail loudly here rather than
+    # 401-ing every request with a None secret.
+    if not JWT_SECRET:
+        raise RuntimeError("JWT_SECRET environment variable is not set")
+    # Open and warm the DB pool before traffic so the first requests
+    # don't pay connection setup.
+    await db.init_db_pool()
+    memory_service.start_flusher()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await memory_service.stop_flusher()
+    await data_service.close_client()
+    await db.close_db_pool()
+
 
 # ---------------- HEALTH ----------------
 @app.get("/health")
@@ -26,57 +97,111 @@ class AskRequest(BaseModel):
     session_id: str | None = None
 
 
+# ---------------- RESPONSE ----------------
+# Fixed response schema so serialization goes through pydantic-core's
+# generated serializer instead of the generic dict-encoding path.
+class Card(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    title: str | None = None
+    subtitle: str | None = None
+    rating: float | str | None = None
+    address: str | None = None
+    description: str | None = None
+    image: str | None = None
+    category_id: int | str | None = None
+    table_id: int | str | None = None
+
+
+class AskResponse(BaseModel):
+    answer: str
+    cards: list[Card] = []
+
+
 # Deterministic no-data response (dataset-only; never suggest alternatives).
 NO_DATA_MSG = "No matching data found in our listings."
 
+# Description clamp for RAG context lines (shared literal, defined once).
+DESC_MAX = 200
+
+# Items surfaced per list answer (context lines and cards share the window).
+MAX_CARDS = 8
+
 # ---------------- DOMAIN KEYWORDS (HARD FILTER) ----------------
 # Must align with intent_service resolver categories. Used for item-text matching.
 # STRICT: one domain per query. MIXED: only for exploratory (fun/activities).
 DOMAIN_KEYWORDS = {
-    "hotel": {"hotel", "hotels", "stay", "lodging", "accommodation"},
-    "resort": {"resort", "resorts"},
-    "villa": {"villa", "villas"},
-    "restaurant": {"restaurant", "restaurants", "cafe", "cafes", "food", "dining"},
-    "hospital": {"hospital", "hospitals", "clinic", "medical", "healthcare"},
-    "ashram": {"ashram", "ashrams"},
-    "theater": {"theater", "theatre", "theaters", "theatres", "cinema", "movie hall", "movie", "movies"},
-    "office": {"office", "offices", "coworking", "workspace"},
-    "religious": {"temple", "temples", "mandir", "mandirs", "mosque", "church", "religious", "worship"},
-    "wine": {"wine", "vineyard", "vineyards", "winery", "wineries"},
-    "treks": {"trek", "treks", "trekking", "hiking", "trail", "trails"},
-    "adventure": {"adventure", "one-day trip", "day trip", "day trips"},
-    "museum": {"museum", "museums"},
-    "events": {"event", "events", "festival", "festivals"},
-    "picnic": {"picnic", "picnic spot", "picnic spots"},
-    "tours": {"tour", "tours", "guided tour", "guided tours", "sightseeing"},
+    "hotel": frozenset({"hotel", "hotels", "stay", "lodging", "accommodation"}),
+    "resort": frozenset({"resort", "resorts"}),
+    "villa": frozenset({"villa", "villas"}),
+    "restaurant": frozenset({"restaurant", "restaurants", "cafe", "cafes", "food", "dining"}),
+    "hospital": frozenset({"hospital", "hospitals", "clinic", "medical", "healthcare"}),
+    "ashram": frozenset({"ashram", "ashrams"}),
+    "theater": frozenset({"theater", "theatre", "theaters", "theatres", "cinema", "movie hall", "movie", "movies"}),
+    "office": frozenset({"office", "offices", "coworking", "workspace"}),
+    "religious": frozenset({"temple", "temples", "mandir", "mandirs", "mosque", "church", "religious", "worship"}),
+    "wine": frozenset({"wine", "vineyard", "vineyards", "winery", "wineries"}),
+    "treks": frozenset({"trek", "treks", "trekking", "hiking", "trail", "trails"}),
+    "adventure": frozenset({"adventure", "one-day trip", "day trip", "day trips"}),
+    "museum": frozenset({"museum", "museums"}),
+    "events": frozenset({"event", "events", "festival", "festivals"}),
+    "picnic": frozenset({"picnic", "picnic spot", "picnic spots"}),
+    "tours": frozenset({"tour", "tours", "guided tour", "guided tours", "sightseeing"}),
 }
 
 # Exploratory: only these categories. Never hospital, office, hotel, resort, villa.
-ALLOWED_EXPLORATORY = {
+ALLOWED_EXPLORATORY = frozenset({
     "theater", "theaters", "museum", "museums",
     "treks", "trek", "picnic", "picnics", "events", "event",
     "tours", "tour", "restaurant", "restaurants",
     "activities", "activity", "adventure", "adventures",
     "wildlife", "wine",
+})
+
+
+# The keyword tables are static, so the nested any(w in q ...) scans are
+# compiled once into alternations: one combined pattern (longest keywords
+# first, plain substring semantics) for query scanning, plus one pattern
+# per domain for item filtering. The same query strings recur constantly,
+# so the query-level scans are also memoized.
+_KEYWORD_TO_DOMAIN = {w: d for d, ws in DOMAIN_KEYWORDS.items() for w in ws}
+_DOMAIN_SCAN_RE = re.compile(
+    "|".join(sorted(map(re.escape, _KEYWORD_TO_DOMAIN), key=len, reverse=True))
+)
+_DOMAIN_PRIORITY = {d: i for i, d in enumerate(DOMAIN_KEYWORDS)}
+_DOMAIN_RES = {
+    d: re.compile("|".join(sorted(map(re.escape, ws), key=len, reverse=True)))
+    for d, ws in DOMAIN_KEYWORDS.items()
 }
 
 
+@lru_cache(maxsize=1024)
 def extract_requested_domains(query: str) -> set[str]:
     q = query.lower()
-    found = set()
-    for domain, words in DOMAIN_KEYWORDS.items():
-        if any(w in q for w in words):
-            found.add(domain)
-    return found
+    return {_KEYWORD_TO_DOMAIN[m.group()] for m in _DOMAIN_SCAN_RE.finditer(q)}
 
 
+@lru_cache(maxsize=1024)
 def _first_requested_domain(query: str) -> str | None:
-    """First matched domain only (dict order). Used when no resolved_domain provided."""
-    q = query.lower()
-    for domain, words in DOMAIN_KEYWORDS.items():
-        if any(w in q for w in words):
-            return domain
-    return None
+    """First matched domain only (DOMAIN_KEYWORDS order). Used when no resolved_domain provided."""
+    found = extract_requested_domains(query)
+    if not found:
+        return None
+    return min(found, key=_DOMAIN_PRIORITY.__getitem__)
+
+
+def _item_blob(item: dict) -> str:
+    """Lowercased searchable text for an item, built once and cached on the
+    dict so repeated filters over the same items skip the join + lower."""
+    blob = item.get("_search_blob")
+    if blob is None:
+        blob = (
+            f"{item.get('vendor_name','')} "
+            f"{item.get('title','')} "
+            f"{item.get('description','')}"
+        ).lower()
+        item["_search_blob"] = blob
+    return blob
 
 
 def filter_by_requested_domain(
@@ -88,80 +213,127 @@ def filter_by_requested_domain(
     - MIXED: only when exploratory=True; keep items matching any MIXED domain.
     """
     if exploratory:
-        filtered = []
-        for item in items:
-            item_cat = (item.get("category") or "").lower().strip()
-            if item_cat in ALLOWED_EXPLORATORY:
-                filtered.append(item)
-        return filtered
+        return [
+            item for item in items
+            if (item.get("category") or "").lower().strip() in ALLOWED_EXPLORATORY
+        ]
 
     domain = resolved_domain if resolved_domain and resolved_domain in DOMAIN_KEYWORDS else _first_requested_domain(query)
     if domain is None:
         return items
 
-    words = DOMAIN_KEYWORDS[domain]
-    filtered = []
-    for item in items:
-        text = (
-            f"{item.get('vendor_name','')} "
-            f"{item.get('title','')} "
-            f"{item.get('description','')}"
-        ).lower()
-        if any(w in text for w in words):
-            filtered.append(item)
-
-    return filtered
+    domain_re = _DOMAIN_RES[domain]
+    return [item for item in items if domain_re.search(_item_blob(item))]
 
 
 # ---------------- INTRO (FIXED) ----------------
 GREETING_WORDS = ("hi", "hello", "hey")
 
-# Self-introduction patterns: "im X", "i'm X", "i am X", "my name is X"
-_NAME_PATTERNS = [
-    re.compile(r"\bi'?m\s+(.+)", re.I),
-    re.compile(r"\bi\s+am\s+(.+)", re.I),
-    re.compile(r"\bmy\s+name\s+is\s+(.+)", re.I),
-]
+# Self-introduction patterns ("im X", "i'm X", "i am X", "my name is X")
+# merged into one alternation: a single scan instead of three.
+_NAME_RE = re.compile(r"\b(?:i'?m|i\s+am|my\s+name\s+is)\s+(.+)", re.I)
 
 
-def _has_greeting(query: str) -> bool:
-    q = query.lower().strip()
-    return any(re.search(rf"\b{re.escape(w)}\b", q) for w in GREETING_WORDS)
+# Token-set membership beats even a compiled regex for three bare words;
+# per-token punctuation strip keeps "hello," matching.
+_GREETING_SET = frozenset(GREETING_WORDS)
 
 
+def _has_greeting(q_lower: str) -> bool:
+    return not _GREETING_SET.isdisjoint(
+        t.strip(",.!?") for t in q_lower.split()
+    )
+
+
+@lru_cache(maxsize=1024)
 def _extract_introduced_name(query: str) -> str | None:
     """Extract name X from self-intro patterns. Deterministic, no LLM."""
-    q = query.strip()
-    for pat in _NAME_PATTERNS:
-        m = pat.search(q)
-        if m:
-            name = m.group(1).strip().rstrip(".,!?")
-            if name and len(name) <= 80:
-                return name
+    m = _NAME_RE.search(query.strip())
+    if m:
+        name = m.group(1).strip().rstrip(".,!?")
+        if name and len(name) <= 80:
+            return name
     return None
 
 
-INTRO_PHRASES = {
+INTRO_PHRASES = frozenset({
     "hi", "hello", "hey",
     "who are you",
     "what can you do",
     "tell me about yourself",
     "introduce yourself",
     "how can you help",
-}
+})
+
+INTRO_MESSAGE: Final[str] = (
+    "Hi! I’m Anvi AI, a Nashik-based travel assistant. "
+    "You can ask me to show, find, or tell you about hotels, resorts, villas, "
+    "restaurants, theaters, ashrams, and other city activities in Nashik."
+)
 
+# One shared response object for every intro reply; handlers only read it.
+INTRO_RESPONSE: Final[dict] = {"answer": INTRO_MESSAGE, "cards": []}
+
+# The intro reply never changes, so its JSON is serialized once at import;
+# greeting paths return these bytes directly and skip validation + encoding.
+_INTRO_JSON: Final[bytes] = orjson.dumps(INTRO_RESPONSE)
+
+
+def _intro_response() -> Response:
+    return Response(content=_INTRO_JSON, media_type="application/json")
+
+# Bare greetings need no auth, memory, or intent work — exact matches only,
+# answered before JWT decode. Anything longer goes through the full flow.
+_FAST_GREETINGS = frozenset({
+    "hi", "hello", "hey", "hi!", "hello!", "hey!", "hi there", "hello there",
+})
+
+# Post-auth exact-match intros: the most common normalized intro queries
+# answered with the canned reply via one dict-style lookup, skipping the
+# conversational scans entirely (the reply is still saved to history).
+_INTRO_FAST_QUERIES = frozenset({
+    "hi", "hello", "hey", "hi there", "hello there", "hey there",
+    "good morning", "good afternoon", "good evening",
+    "who are you", "who are you?",
+    "what can you do", "what can you do?",
+    "introduce yourself", "tell me about yourself",
+    "how can you help", "how can you help?",
+})
+
+
+# Single-word phrases are token-set lookups (hi ≠ nashik); only true
+# multi-word phrases need the substring alternation.
+_SINGLE_INTRO_SET = frozenset(p for p in INTRO_PHRASES if " " not in p)
+_MULTI_INTRO_RE = re.compile(
+    "|".join(
+        re.escape(p)
+        for p in sorted((p for p in INTRO_PHRASES if " " in p), key=len, reverse=True)
+    )
+)
 
-def is_intro_query(query: str) -> bool:
-    q = query.lower().strip()
-    for p in INTRO_PHRASES:
-        if " " in p:
-            if p in q:
-                return True
-        else:
-            # WORD BOUNDARY FIX (hi ≠ nashik)
-            if re.search(rf"\b{re.escape(p)}\b", q):
-                return True
-    return False
+
+# Anything much longer than the longest intro phrase is a real question,
+# not an intro — skip the scans entirely for those.
+_INTRO_MAX_LEN = 2 * max(map(len, INTRO_PHRASES))
+
+
+def is_intro_query(q_lower: str) -> bool:
+    if len(q_lower) > _INTRO_MAX_LEN:
+        return False
+    if not _SINGLE_INTRO_SET.isdisjoint(t.strip(",.!?") for t in q_lower.split()):
+        return True
+    return _MULTI_INTRO_RE.search(q_lower) is not None
+
+
+# First tokens that can plausibly begin a greeting, intro question, or
+# self-introduction. Typical domain queries ("hotels in nashik", "hotel
+# vaishali rating") fail this one frozenset lookup and skip all three
+# conversational scans below.
+_CONV_FIRST_WORDS = frozenset({
+    "hi", "hello", "hey", "good", "ok", "okay", "so", "please", "can",
+    "who", "what", "how", "tell", "introduce", "about",
+    "i", "i'm", "im", "my",
+})
 
 
 MEMORY_QUESTION_PHRASES = (
@@ -170,110 +342,191 @@ MEMORY_QUESTION_PHRASES = (
     "what did i ask earlier", "what did i say earlier",
 )
 
+# All phrases in one compiled alternation: a single scan instead of one
+# substring pass per phrase. Substring semantics kept (no \b).
+_MEMORY_RE = re.compile("|".join(map(re.escape, MEMORY_QUESTION_PHRASES)))
+
+# Same cheap pre-filter as the intro check: long queries can't be a
+# memory question plus a few filler words.
+_MEMORY_MAX_LEN = 3 * max(map(len, MEMORY_QUESTION_PHRASES))
 
-def _is_memory_question(query: str) -> bool:
-    q = query.lower().strip()
-    return any(p in q for p in MEMORY_QUESTION_PHRASES)
 
+def _is_memory_question(q_lower: str) -> bool:
+    if len(q_lower) > _MEMORY_MAX_LEN:
+        return False
+    return _MEMORY_RE.search(q_lower) is not None
 
-FOLLOW_UP_WORDS = ("yes", "more", "continue")
 
+FOLLOW_UP_WORDS = frozenset({"yes", "more", "continue"})
 
-def _is_follow_up(query: str) -> bool:
-    return query.strip().lower() in FOLLOW_UP_WORDS
+
+# ---------------- CARDS ----------------
+# Card projection, precomputed once: response key <-> item key. map(i.get, ...)
+# pulls all fields in one C-level pass; items are sparse API dicts, so .get
+# (not itemgetter) keeps missing fields as None.
+_CARD_KEYS = ("title", "subtitle", "rating", "address", "description", "image", "category_id", "table_id")
+_ITEM_FIELDS = ("vendor_name", "area_name", "star_rating", "address", "description", "image_url", "category_id", "table_id")
+
+
+def _make_card(item: dict) -> dict:
+    return dict(zip(_CARD_KEYS, map(item.get, _ITEM_FIELDS)))
+
+
+# Same projection for normalized entities (resolve_entity output), whose
+# field names differ from raw search items.
+_ENTITY_FIELDS = ("name", "area_name", "rating", "address", "description", "image_url", "category_id", "table_id")
+
+
+def _make_entity_card(entity: dict) -> dict:
+    return dict(zip(_CARD_KEYS, map(entity.get, _ENTITY_FIELDS)))
+
+
+# Context line layout for the general-search RAG block, built once instead
+# of re-assembling the multi-line f-string constants per item per request.
+_RAG_LINE_TMPL = (
+    "[{idx}]\n"
+    "Name: {name}\n"
+    "Area: {area}\n"
+    "Rating: {rating}\n"
+    "Address: {address}\n"
+    "Description: {desc}\n----"
+)
+
+
+def _attribute_response(background: BackgroundTasks, user_id: str, entity_data: dict, attr: str) -> dict:
+    """Shared tail of the two single-entity attribute paths (global bypass
+    and entity lookup): format the answer, persist it out of band, respond."""
+    answer = format_attribute_answer(entity_data, attr, entity_data.get(attr))
+    background.add_task(save_message, user_id, "assistant", answer)
+    return {"answer": answer, "cards": []}
+
+
+def _is_follow_up(q_lower: str) -> bool:
+    return q_lower in FOLLOW_UP_WORDS
 
 
 def _get_previous_user_message(messages: list) -> str | None:
     """Last user message before the current one (current is last in list)."""
-    user_contents = [m["content"] for m in messages if m.get("role") == "user"]
-    return user_contents[-2] if len(user_contents) >= 2 else None
+    seen = 0
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            seen += 1
+            if seen == 2:
+                return m["content"]
+    return None
 
 
 # ---------------- MAIN ----------------
-@app.post("/ask")
-async def ask_ai(req: AskRequest, authorization: str = Header(None)):
+@app.post("/ask", response_model=AskResponse)
+async def ask_ai(req: AskRequest, background: BackgroundTasks, authorization: str = Header(None)):
+
+    # ---------- GREETING FAST PATH (pre-auth) ----------
+    # A bare "hi" costs a JWT verify plus two DB writes on the normal path;
+    # answer it immediately with the canned intro instead.
+    if req.query.strip().lower() in _FAST_GREETINGS:
+        return _intro_response()
 
     # ---------- AUTH ----------
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     token = authorization.split(" ", 1)[1]
-    JWT_SECRET = os.getenv("JWT_SECRET")
 
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = await _decode_token(token)
         user_id = str(payload["user_id"])
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
     query = req.query.strip()
+    # Lowercase once; every detector below reads this instead of
+    # re-allocating its own lowered copy.
+    q_lower = query.lower()
     await save_message(user_id, "user", query)
 
-    # ---------- INTRO: greeting + self-introduction (name) → acknowledge name, no RAG ----------
-    intro_name = _extract_introduced_name(query)
-    if _has_greeting(query) and intro_name:
-        answer = (
-            f"Hi {intro_name}! Nice to meet you. I'm Anvi AI, your Nashik travel assistant. "
-            "How can I help you with your travel plans today?"
-        )
-        await save_message(user_id, "assistant", answer)
-        return {"answer": answer, "cards": []}
+    # ---------- INTRO FAST PATH (post-auth, exact match) ----------
+    # One set lookup answers the most common intros before any history
+    # task, scans, or intent work is started.
+    if q_lower in _INTRO_FAST_QUERIES:
+        background.add_task(save_message, user_id, "assistant", INTRO_MESSAGE)
+        return _intro_response()
+
+    # Several branches need chat history; start the fetch immediately after
+    # the user-message save so it overlaps all the work below. Branches that
+    # never await it just let the read finish in the background.
+    history_task = asyncio.create_task(get_recent_messages(user_id, limit=20))
+
+    # Conversational branches can only start with one of a handful of
+    # words; one set lookup spares domain queries the scans below.
+    if q_lower.partition(" ")[0].strip(",.!?") in _CONV_FIRST_WORDS:
+        # ---------- INTRO: greeting + self-introduction (name) → acknowledge name, no RAG ----------
+        intro_name = _extract_introduced_name(query)
+        if _has_greeting(q_lower) and intro_name:
+            answer = (
+                f"Hi {intro_name}! Nice to meet you. I'm Anvi AI, your Nashik travel assistant. "
+                "How can I help you with your travel plans today?"
+            )
+            background.add_task(save_message, user_id, "assistant", answer)
+            return {"answer": answer, "cards": []}
 
-    # ---------- INTRO: greeting only or other intro phrases ----------
-    if is_intro_query(query):
-        answer = (
-            "Hi! I’m Anvi AI, a Nashik-based travel assistant. "
-            "You can ask me to show, find, or tell you about hotels, resorts, villas, "
-            "restaurants, theaters, ashrams, and other city activities in Nashik."
-        )
-        await save_message(user_id, "assistant", answer)
-        return {"answer": answer, "cards": []}
+        # ---------- INTRO: greeting only or other intro phrases ----------
+        if is_intro_query(q_lower):
+            background.add_task(save_message, user_id, "assistant", INTRO_MESSAGE)
+            return _intro_response()
 
     # ---------- MEMORY-QUESTION GUARD (before intent) ----------
-    if _is_memory_question(query):
-        messages = await get_recent_messages(user_id, limit=20)
+    if _is_memory_question(q_lower):
+        messages = await history_task
         prev_user = _get_previous_user_message(messages)
         if prev_user:
             answer = f'You asked: "{prev_user}"'
         else:
             answer = "I don't have a previous question from you in this conversation."
-        await save_message(user_id, "assistant", answer)
+        background.add_task(save_message, user_id, "assistant", answer)
         return {"answer": answer, "cards": []}
 
     # ---------- FOLLOW-UP GUARD: reuse previous query/intent (before intent) ----------
     effective_query = query
-    if _is_follow_up(query):
-        messages = await get_recent_messages(user_id, limit=20)
+    if _is_follow_up(q_lower):
+        messages = await history_task
         prev_user = _get_previous_user_message(messages)
         if prev_user:
             effective_query = prev_user
 
     # ---------- INTENT ----------
-    intent = extract_intent(effective_query) or {}
+    # One fused parse yields both the intent and the detected attribute;
+    # it's pure-Python regex/keyword scanning, so run it in a worker
+    # thread where a burst of long queries can't stall the event loop.
+    parsed = await asyncio.to_thread(extract_intent_and_attribute, effective_query)
+    intent = parsed["intent"] or {}
 
     # =========================================================
     # GLOBAL ENTITY + ATTRIBUTE BYPASS (runs for ALL queries)
     # =========================================================
-    detected_attribute = detect_attribute(query)
-
-    # Try resolving entity regardless of intent type
-    potential_entity_name = intent.get("entity_name") or intent.get("entity") or query
-
-    entity_data = await resolve_entity(potential_entity_name, intent, token=token)
+    # The attribute comes from the same parse; only re-scan when a
+    # follow-up rewrote the query out from under it.
+    if effective_query == query:
+        detected_attribute = parsed["attribute"]
+    else:
+        detected_attribute = detect_attribute(query)
+
+    # The bypass result is only used when an attribute was detected, so the
+    # resolve_entity round-trip is skipped entirely otherwise. A single
+    # tokenize-and-filter pass over the candidate name also short-circuits
+    # queries that cannot name a specific entity (empty after stopword
+    # removal, or pure category words like "hotels") before the remote call.
+    entity_data = None
+    if detected_attribute:
+        potential_entity_name = intent.get("entity_name") or intent.get("entity") or query
+        entity_tokens = tuple(
+            t for t in potential_entity_name.lower().split() if t not in STOPWORDS
+        )
+        if entity_tokens and not all(t in PURE_CATEGORY_WORDS for t in entity_tokens):
+            entity_data = await resolve_entity(potential_entity_name, intent, token=token)
 
     if entity_data and detected_attribute:
-        print(f"[DEBUG] GLOBAL entity+attribute → {entity_data.get('name')} | attr={detected_attribute}")
-
-        value = entity_data.get(detected_attribute)
-        answer = format_attribute_answer(entity_data, detected_attribute, value)
-
-        await save_message(user_id, "assistant", answer)
-        print(f"[DEBUG] GLOBAL attribute response stored")
-
-        return {
-            "answer": answer,
-            "cards": []
-        }
+        log.debug("GLOBAL entity+attribute -> %s | attr=%s", entity_data.get("name"), detected_attribute)
+        return _attribute_response(background, user_id, entity_data, detected_attribute)
 
     # --- ENTITY ATTRIBUTE SHORT-CIRCUIT ---
     if intent.get("type") == "entity_attribute":
@@ -283,7 +536,7 @@ async def ask_ai(req: AskRequest, authorization: str = Header(None)):
         entity = await resolve_entity(entity_name, intent, token=token)
 
         if not entity:
-            await save_message(user_id, "assistant", f"I couldn't find {entity_name} in our listings.")
+            background.add_task(save_message, user_id, "assistant", f"I couldn't find {entity_name} in our listings.")
             return {
                 "answer": f"I couldn't find {entity_name} in our listings.",
                 "cards": []
@@ -295,10 +548,10 @@ async def ask_ai(req: AskRequest, authorization: str = Header(None)):
         ]
         answer = " ".join(answer_parts) if answer_parts else "No attributes requested."
 
-        await save_message(user_id, "assistant", answer)
+        background.add_task(save_message, user_id, "assistant", answer)
         return {
             "answer": answer,
-            "cards": [entity]
+            "cards": [_make_entity_card(entity)]
         }
     # --- END ENTITY ATTRIBUTE SHORT-CIRCUIT ---
 
@@ -315,21 +568,21 @@ async def ask_ai(req: AskRequest, authorization: str = Header(None)):
 
         items = await get_rag_items(effective_query, intent)
 
+        # Only a unique RAG hit is definitive. With no intent keywords the
+        # search scores are all zero and items come back in raw API order,
+        # so the head of a multi-hit list is arbitrary — those fall through
+        # to resolve_entity's name matching over the full result set.
         entity_data = items[0] if len(items) == 1 else None
 
         if not entity_data and entity_name:
             entity_data = await resolve_entity(entity_name, intent, token=token)
 
         if entity_data:
-            attr = detect_attribute(query)
-            if attr:
-                answer = format_attribute_answer(
-                    entity_data, attr, entity_data.get(attr)
-                )
-                await save_message(user_id, "assistant", answer)
-                return {"answer": answer, "cards": []}
-
-            history = await get_recent_messages(user_id)
+            # Same query, same result — reuse the attribute detected above.
+            if detected_attribute:
+                return _attribute_response(background, user_id, entity_data, detected_attribute)
+
+            history = await history_task
             answer = await answer_with_ai(
                 query=query,
                 context=entity_data.get("description", ""),
@@ -337,55 +590,69 @@ async def ask_ai(req: AskRequest, authorization: str = Header(None)):
                 memory=history,
             )
 
-            card = {
-                "title": entity_data.get("vendor_name"),
-                "subtitle": entity_data.get("area_name"),
-                "rating": entity_data.get("star_rating"),
-                "address": entity_data.get("address"),
-                "description": entity_data.get("description"),
-                "image": entity_data.get("image_url"),
-                "category_id": entity_data.get("category_id"),
-                "table_id": entity_data.get("table_id"),
-            }
+            card = _make_card(entity_data)
 
-            await save_message(user_id, "assistant", answer)
+            background.add_task(save_message, user_id, "assistant", answer)
             return {"answer": answer, "cards": [card]}
 
-        await save_message(user_id, "assistant", NO_DATA_MSG)
+        background.add_task(save_message, user_id, "assistant", NO_DATA_MSG)
         return {"answer": NO_DATA_MSG, "cards": []}
 
     # ===================================================
     # GENERAL SEARCH (LIST FLOW)
     # ===================================================
-    items = await get_rag_items(effective_query, intent)
+    # Semantic cache: near-identical queries skip the RAG fetch and LLM call.
+    # Entity lookups never reach here, so only list answers are cached.
+    # Scoped per user: answers are generated with the user's own chat
+    # history as context, so a cached answer may carry personal details
+    # and must never be served to anyone else.
+    cache_domain = f"{user_id}|{intent.get('search_domain') or ''}"
+    cached = semantic_cache.lookup(effective_query, cache_domain)
+    if cached is not None:
+        background.add_task(save_message, user_id, "assistant", cached["answer"])
+        return cached
+
+    # RAG fetch overlaps the shared history task (started right after the
+    # user-message save); awaiting the task again costs nothing if an
+    # earlier guard already resolved it.
+    items, history = await asyncio.gather(
+        get_rag_items(effective_query, intent),
+        history_task,
+        return_exceptions=True,
+    )
+    if isinstance(items, BaseException):
+        log.error("get_rag_items failed: %s", items)
+        items = []
+    if isinstance(history, BaseException):
+        log.error("get_recent_messages failed: %s", history)
+        history = []
 
     # HARD STOP if amenity requested but no match
     if intent.get("must_have") and not items:
-        await save_message(user_id, "assistant", NO_DATA_MSG)
+        background.add_task(save_message, user_id, "assistant", NO_DATA_MSG)
         return {"answer": NO_DATA_MSG, "cards": []}
 
-    # Build RAG context ONLY from these filtered items
+    # Build RAG context ONLY from these filtered items. One pass projects
+    # each item into its card and reuses those fields for the context
+    # line, instead of pulling the same keys twice in two loops.
     rag_lines = []
-    for idx, i in enumerate(items[:8], 1):
-        name = i.get("vendor_name") or i.get("name") or "Unknown"
-        area = i.get("area_name") or ""
-        rating = i.get("star_rating") or ""
-        address = i.get("address") or ""
-        desc = (i.get("short_description") or i.get("description") or "")[:200]
-
+    cards = []
+    for idx, i in enumerate(items[:MAX_CARDS], 1):
+        card = _make_card(i)
+        cards.append(card)
         rag_lines.append(
-            f"[{idx}]\n"
-            f"Name: {name}\n"
-            f"Area: {area}\n"
-            f"Rating: {rating}\n"
-            f"Address: {address}\n"
-            f"Description: {desc}\n----"
+            _RAG_LINE_TMPL.format(
+                idx=idx,
+                name=card["title"] or i.get("name") or "Unknown",
+                area=card["subtitle"] or "",
+                rating=card["rating"] or "",
+                address=card["address"] or "",
+                desc=(i.get("short_description") or card["description"] or "")[:DESC_MAX],
+            )
         )
 
     rag_context = "\n".join(rag_lines).strip()
 
-    history = await get_recent_messages(user_id)
-
     answer = await answer_with_ai(
         query=effective_query,
         context=rag_context,
@@ -393,16 +660,29 @@ async def ask_ai(req: AskRequest, authorization: str = Header(None)):
         memory=history,
     )
 
-    cards = [{
-        "title": i.get("vendor_name"),
-        "subtitle": i.get("area_name"),
-        "rating": i.get("star_rating"),
-        "address": i.get("address"),
-        "description": i.get("description"),
-        "image": i.get("image_url"),
-        "category_id": i.get("category_id"),
-        "table_id": i.get("table_id"),
-    } for i in items[:8]]
-
-    await save_message(user_id, "assistant", answer)
+    if answer != NO_DATA_MSG:
+        semantic_cache.store(effective_query, cache_domain, {"answer": answer, "cards": cards})
+
+    # The client doesn't need the memory write to land before it sees the
+    # answer — persist after the response is sent.
+    background.add_task(save_message, user_id, "assistant", answer)
     return {"answer": answer, "cards": cards}
+
+
+# ---------------- ENTRYPOINT ----------------
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop + httptools (bundled with uvicorn[standard]) replace the default
+    # asyncio loop and HTTP parser with C implementations; one worker per
+    # core lets CPU-bound request handling scale across processes. All
+    # module-level caches are per-worker by design.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        backlog=2048,
+    )
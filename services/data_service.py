@@ -1,11 +1,19 @@
 # services/data_service.py
 
+import asyncio
+import logging
 import os
+import re
+import sys
+from difflib import SequenceMatcher
+from functools import lru_cache
 from typing import Any, Dict, List
 from fastapi import Query
 import httpx
+import orjson
 from dotenv import load_dotenv
 
+from utils.cache import TTLCache
 from utils.image_utils import build_image_url
 
 load_dotenv()
@@ -13,7 +21,125 @@ load_dotenv()
 API_TOKEN = os.getenv("NASHIK_API_TOKEN", "").strip()
 BASE_URL = "https://nashikguide.sapphiredigital.agency/api/search/"
 
+log = logging.getLogger("anvi.data")
+
+# Amenity cap applied once at normalization so downstream formatting
+# never re-slices the list per request.
+AMEN_MAX = 12
+
+# Resolved entities rarely change and the same names recur within a session;
+# cache hits skip the full API round-trip + matching scan. Keyed on the
+# effective bearer token (like _FETCH_CACHE below) so an entity resolved
+# under one caller's token is never served to another.
+_ENTITY_CACHE = TTLCache(maxsize=4096, ttl=600)
+
+# In-flight resolutions keyed like the cache: concurrent requests for the
+# same entity await one shared task instead of each hitting the API.
+_INFLIGHT: Dict[tuple, asyncio.Task] = {}
+
+# Raw API responses for a given (query, token) are identical across repeated
+# turns; caching them skips the round-trip entirely — the network RTT dwarfs
+# everything else in a search. Keyed on the token so bearer-scoped data never
+# crosses tenants.
+_FETCH_CACHE = TTLCache(maxsize=256, ttl=300)
+_FETCH_INFLIGHT: Dict[tuple, asyncio.Task] = {}
+
+# One shared AsyncClient so every search call reuses kept-alive
+# connections instead of paying a TCP+TLS handshake per request.
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        # HTTP/2 multiplexes the parallel resolve/search fetches over one
+        # connection, and compressed transfer cuts the ~100KB JSON pages
+        # to a fraction on the wire (httpx decompresses transparently).
+        _client = httpx.AsyncClient(
+            timeout=15.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            http2=True,
+            headers={"Accept-Encoding": "gzip, br"},
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client. Call from app shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _fetch_raw_items(query: str, effective_token: str) -> List[Dict[str, Any]]:
+    """
+    GET the search endpoint and return the raw item list.
+
+    Shared by resolve_entity and search_api; responses are cached per
+    (query, token) and concurrent fetches for the same key are coalesced
+    onto one request, mirroring the entity-cache pattern above.
+    """
+    cache_key = (query, effective_token)
+    cached = _FETCH_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    inflight = _FETCH_INFLIGHT.get(cache_key)
+    if inflight is not None:
+        return await inflight
+
+    task = asyncio.ensure_future(_fetch_raw_items_uncached(query, effective_token, cache_key))
+    _FETCH_INFLIGHT[cache_key] = task
+    try:
+        return await task
+    finally:
+        _FETCH_INFLIGHT.pop(cache_key, None)
+
+
+async def _fetch_raw_items_uncached(
+    query: str,
+    effective_token: str,
+    cache_key: tuple,
+) -> List[Dict[str, Any]]:
+    params = {
+        "query": query,
+        "page": 1,
+        "limit": 200,
+    }
+    headers = {
+        "Authorization": f"Bearer {effective_token}",
+        "Accept": "application/json",
+    }
 
+    response = await get_client().get(BASE_URL, params=params, headers=headers)
+    response.raise_for_status()
+    # orjson decodes the ~200-item payload several times faster than the
+    # stdlib json that httpx's .json() uses.
+    payload = orjson.loads(response.content)
+
+    raw_items: List[Dict[str, Any]] = []
+    if (
+        isinstance(payload, dict)
+        and isinstance(payload.get("data"), dict)
+        and isinstance(payload["data"].get("search_data"), list)
+    ):
+        raw_items = payload["data"]["search_data"]
+
+    # Errors propagate to the caller uncached; only real responses stick.
+    _FETCH_CACHE.set(cache_key, raw_items)
+    _index_items(raw_items, effective_token)
+    return raw_items
+
+
+# Filler tokens dropped during name matching. A frozenset lookup beats the
+# tuple membership scan the old implementation did per token.
+_NAME_STOPWORDS = frozenset({"hotel", "the"})
+
+
+# The same vendor/name strings recur across items, passes, and requests;
+# cached normalizations make repeats an O(1) lookup.
+@lru_cache(maxsize=4096)
 def normalize_name(name: str) -> str:
     """
     Normalize a name for matching by:
@@ -23,97 +149,127 @@ def normalize_name(name: str) -> str:
     """
     if not name:
         return ""
-    normalized = name.lower().strip()
-    # Remove stopwords as whole tokens
-    tokens = normalized.split()
-    tokens = [t for t in tokens if t not in ("hotel", "the")]
-    return " ".join(tokens).strip()
+    # split() already eats surrounding/duplicate whitespace, so the whole
+    # normalization is one pass with no intermediate list.
+    return " ".join(t for t in name.lower().split() if t not in _NAME_STOPWORDS)
 
 
-def _normalize_name_for_matching(name: str) -> str:
-    """
-    Normalize a name for matching by:
-    - lowercasing
-    - removing the word "hotel"
-    - stripping extra spaces
-    """
-    return normalize_name(name)
+# Minimum similarity for accepting a single-token containment match.
+_MATCH_RATIO = 0.85
+
+# Token-overlap matching in entity resolution: pattern and stopwords hoisted
+# so they aren't rebuilt on every call (both titles and queries go through
+# this for up to 200 items per resolution).
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_MATCH_STOPWORDS = frozenset(
+    {"dr", "mr", "mrs", "ms", "hospital", "hotel", "temple", "in", "at", "the", "road", "rd", "nagar"}
+)
+
+
+def _normalize_tokens(text: str) -> set:
+    return {t for t in _TOKEN_RE.findall(text.lower()) if t not in _MATCH_STOPWORDS}
+
+
+def _names_match(query_norm: str, cand_norm: str) -> bool:
+    """Guarded name comparison: exact match, else containment — but a
+    single-token containment ("grand" inside every "grand ...") must also
+    clear a similarity ratio so one common word can't claim any hotel."""
+    if query_norm == cand_norm:
+        return True
+    if query_norm in cand_norm or cand_norm in query_norm:
+        shorter = min(query_norm, cand_norm, key=len)
+        if " " in shorter:
+            return True
+        return SequenceMatcher(None, query_norm, cand_norm).ratio() >= _MATCH_RATIO
+    return False
 
 
 def find_exact_hotel(items, query_name: str):
     """
     Find hotel using normalized token-based comparison.
-    Matches using containment after normalizing both query and hotel names.
+    Matches using guarded containment after normalizing both names.
     """
-    query_normalized = _normalize_name_for_matching(query_name)
-    
+    query_normalized = normalize_name(query_name)
+
     if not query_normalized:
         return None
 
     for item in items:
         # Try vendor_name first
         vendor_name = item.get("vendor_name", "")
-        if vendor_name:
-            vendor_normalized = _normalize_name_for_matching(vendor_name)
-            if query_normalized in vendor_normalized or vendor_normalized in query_normalized:
-                return item
-        
+        if vendor_name and _names_match(query_normalized, normalize_name(vendor_name)):
+            return item
+
         # Try name field
         name = item.get("name", "")
-        if name:
-            name_normalized = _normalize_name_for_matching(name)
-            if query_normalized in name_normalized or name_normalized in query_normalized:
-                return item
+        if name and _names_match(query_normalized, normalize_name(name)):
+            return item
 
     return None
 
 
+def _yn(value: Any) -> bool:
+    """API boolean flags arrive as "Y"/"N" strings or real booleans."""
+    return value == "Y" or value is True
+
+
 def normalize_hotel_entity(hotel: Dict[str, Any]) -> Dict[str, Any]:
     """
     Normalize hotel entity data into a consistent structure.
     """
+    g = hotel.get  # bind once; the projection below does ~25 lookups
+
     amenities_list = []
-    if isinstance(hotel.get("amenities_gallery"), list):
-        for a in hotel.get("amenities_gallery", []):
+    if isinstance(g("amenities_gallery"), list):
+        for a in hotel["amenities_gallery"]:
             if isinstance(a, dict) and a.get("amenity"):
                 amenities_list.append(a["amenity"])
-    
-    # Check amenities_gallery for wifi, pool, bonfire
-    amenities_lower = [a.lower() for a in amenities_list]
-    has_wifi = any("wifi" in a or "wi-fi" in a for a in amenities_lower)
-    has_pool = any("pool" in a for a in amenities_lower)
-    has_bonfire = any("bonfire" in a for a in amenities_lower)
-    
+
+    # One pass over the amenities for all three flags instead of three
+    # any() scans over a lowered copy.
+    has_wifi = has_pool = has_bonfire = False
+    for a in amenities_list:
+        al = a.lower()
+        if "wifi" in al or "wi-fi" in al:
+            has_wifi = True
+        if "pool" in al:
+            has_pool = True
+        if "bonfire" in al:
+            has_bonfire = True
+
+    google_location = g("google_location")
+
     return {
-        "name": hotel.get("name") or hotel.get("vendor_name"),
-        "rating": hotel.get("star_rating"),
-        "address": hotel.get("address"),
-        "phone": hotel.get("phone"),
-        "email": hotel.get("email"),
-        "website": hotel.get("website"),
-        "pet_friendly": hotel.get("pet_friendly") == "Y" or hotel.get("pet_friendly") == True,
-        "parking": hotel.get("parking_available") == "Y" or hotel.get("parking_available") == True,
-        "air_conditioned": hotel.get("air_conditioned") == "Y" or hotel.get("air_conditioned") == True,
-        "food_available": hotel.get("food_available") == "Y" or hotel.get("food_available") == True,
-        "price_from": hotel.get("price_from"),
-        "price_unit": hotel.get("price_unit"),
-        "map": hotel.get("google_location"),
-        "amenities": amenities_list,
+        "name": g("name") or g("vendor_name"),
+        "rating": g("star_rating"),
+        "address": g("address"),
+        "phone": g("phone"),
+        "email": g("email"),
+        "website": g("website"),
+        "pet_friendly": _yn(g("pet_friendly")),
+        "parking": _yn(g("parking_available")),
+        "air_conditioned": _yn(g("air_conditioned")),
+        "food_available": _yn(g("food_available")),
+        "price_from": g("price_from"),
+        "price_unit": g("price_unit"),
+        "map": google_location,
+        # Capped, immutable copy so answer formatting never re-slices it.
+        "amenities": tuple(amenities_list[:AMEN_MAX]),
         "wifi": has_wifi,
         "pool": has_pool,
         "bonfire": has_bonfire,
-        "google_location": hotel.get("google_location"),
-        "kitchen_available": hotel.get("kitchen_available") == "Y" or hotel.get("kitchen_available") == True,
-        "taxes_included": hotel.get("taxes_included") == "Y" or hotel.get("taxes_included") == True,
-        "cancellation": hotel.get("cancellation"),
+        "google_location": google_location,
+        "kitchen_available": _yn(g("kitchen_available")),
+        "taxes_included": _yn(g("taxes_included")),
+        "cancellation": g("cancellation"),
         # Card fields (for entity-only queries)
-        "image_url": hotel.get("image_url"),
-        "area_name": hotel.get("area_name"),
-        "zone_name": hotel.get("zone_name"),
-        "description": hotel.get("description") or hotel.get("short_description"),
+        "image_url": g("image_url"),
+        "area_name": g("area_name"),
+        "zone_name": g("zone_name"),
+        "description": g("description") or g("short_description"),
         # Backend-only identifiers for internal navigation/filtering
-        "table_id": hotel.get("table_id"),
-        "category_id": hotel.get("category_id"),
+        "table_id": g("table_id"),
+        "category_id": g("category_id"),
     }
 
 
@@ -131,52 +287,133 @@ async def resolve_entity(
     2. Performing name-based matching over ALL fetched items
     3. NOT relying on ranking or _score for entity resolution
     """
-    import re
+    # Prefer caller-provided Bearer token; fall back to .env token
+    effective_token = (token or "").strip() or API_TOKEN
 
-    def _normalize_tokens(text: str) -> set:
-        STOPWORDS = {"dr", "mr", "mrs", "ms", "hospital", "hotel", "temple", "in", "at", "the", "road", "rd", "nagar"}
-        tokens = set(re.findall(r"[a-z0-9]+", text.lower()))
-        return {t for t in tokens if t not in STOPWORDS}
+    cache_key = (
+        (entity_name or "").lower().strip(),
+        (intent.get("search_domain") or intent.get("category") or "").lower(),
+        effective_token,
+    )
+    cached = _ENTITY_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Coalesce: a resolution for this key may already be on the wire
+    # (earlier branch of the same request, or a concurrent request).
+    inflight = _INFLIGHT.get(cache_key)
+    if inflight is not None:
+        return await inflight
+
+    task = asyncio.ensure_future(
+        _resolve_entity_uncached(entity_name, intent, effective_token, cache_key)
+    )
+    _INFLIGHT[cache_key] = task
+    try:
+        return await task
+    finally:
+        _INFLIGHT.pop(cache_key, None)
 
-    # Fetch items directly from API without ranking
-    # This ensures we check ALL items, not just top-ranked results
-    params = {
-        "query": entity_name,
-        "page": 1,
-        "limit": 200,
-    }
 
-    # Prefer caller-provided Bearer token; fall back to .env token
-    effective_token = (token or "").strip() or API_TOKEN
+# Opportunistic inverted index over hotel names seen in any fetched payload:
+# {trigram -> item ids} plus the raw items by id. A later resolution whose
+# name trigrams overlap an indexed item strongly enough is answered locally
+# with the same token-overlap rule as the remote path, skipping the API
+# round-trip entirely. Ids are (bearer token, table_id) pairs and probes
+# only match entries fetched under the caller's own token, same scoping as
+# _FETCH_CACHE. Bounded: hitting _INDEX_MAX clears both maps and entries
+# simply re-register from subsequent fetches.
+_INDEX_MAX = 5000
+_NAME_INDEX: Dict[str, set] = {}
+_ITEM_BY_ID: Dict[tuple, Dict[str, Any]] = {}
 
-    headers = {
-        "Authorization": f"Bearer {effective_token}",
-        "Accept": "application/json",
-    }
 
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(BASE_URL, params=params, headers=headers)
-            response.raise_for_status()
-            payload = response.json()
-    except Exception as e:
-        print("[ERROR] resolve_entity API exception:", e)
-        return None
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
 
-    # Extract raw items
-    raw_items: List[Dict[str, Any]] = []
-    if (
-        isinstance(payload, dict)
-        and isinstance(payload.get("data"), dict)
-        and isinstance(payload["data"].get("search_data"), list)
-    ):
-        raw_items = payload["data"]["search_data"]
 
-    if not raw_items:
+def _index_items(raw_items: List[Dict[str, Any]], effective_token: str) -> None:
+    for item in raw_items:
+        if not isinstance(item, dict):
+            continue
+        table_id = item.get("table_id")
+        if table_id is None:
+            continue
+        item_id = (effective_token, table_id)
+        if item_id in _ITEM_BY_ID:
+            continue
+        name = normalize_name(
+            item.get("title") or item.get("vendor_name") or item.get("name") or ""
+        )
+        if len(name) < 3:
+            continue
+        if len(_ITEM_BY_ID) >= _INDEX_MAX:
+            _NAME_INDEX.clear()
+            _ITEM_BY_ID.clear()
+        _ITEM_BY_ID[item_id] = item
+        for tri in _trigrams(name):
+            _NAME_INDEX.setdefault(tri, set()).add(item_id)
+
+
+def _probe_name_index(
+    entity_name: str,
+    query_tokens: set,
+    effective_token: str,
+) -> Dict[str, Any] | None:
+    """Best locally-indexed item for the query, or None on a miss."""
+    tris = _trigrams(normalize_name(entity_name))
+    if not tris:
         return None
 
-    # Normalize items (add image_url, but skip ranking/scoring)
-    items: List[Dict[str, Any]] = []
+    counts: Dict[tuple, int] = {}
+    for tri in tris:
+        for item_id in _NAME_INDEX.get(tri, ()):
+            if item_id[0] != effective_token:
+                continue
+            counts[item_id] = counts.get(item_id, 0) + 1
+
+    # Candidates must share most of the query's trigrams; the final accept
+    # still goes through the same token-overlap match as the remote path.
+    threshold = 0.6 * len(tris)
+    candidates = [_ITEM_BY_ID[i] for i, c in counts.items() if c >= threshold]
+    if not candidates:
+        return None
+    return _match_best_item(candidates, query_tokens)
+
+
+async def resolve_entities(
+    names: List[str],
+    intent: Dict[str, Any],
+    token: str | None = None,
+) -> List[Dict[str, Any] | None]:
+    """
+    Resolve several entity names concurrently.
+
+    Duplicates are collapsed to one resolution, lookups run under one
+    asyncio.gather, and each name still goes through resolve_entity's
+    cache + in-flight coalescing. Results come back in input order.
+    """
+    uniq = list(dict.fromkeys(names))
+    results = await asyncio.gather(
+        *(resolve_entity(name, intent, token) for name in uniq)
+    )
+    by_name = dict(zip(uniq, results))
+    return [by_name[name] for name in names]
+
+
+def _match_best_item(
+    raw_items: List[Dict[str, Any]],
+    query_tokens: set,
+) -> Dict[str, Any] | None:
+    """
+    Post-fetch pass for entity resolution: attach image URLs and pick the
+    best token-overlap match. Sync on purpose — callers offload it via
+    asyncio.to_thread.
+    """
+    best_match: Dict[str, Any] | None = None
+    best_score = 0.0
+    query_len = len(query_tokens)  # callers guarantee non-empty
+
     for item in raw_items:
         if not isinstance(item, dict):
             continue
@@ -188,38 +425,129 @@ async def resolve_entity(
             image_path = item["gallery_images"][0]
 
         item["image_url"] = build_image_url(image_path)
-        items.append(item)
-
-    # ----------------------------------------
-    # Token-overlap matching (deterministic, no LLM)
-    # ----------------------------------------
-    query_tokens = _normalize_tokens(entity_name)
-    if not query_tokens:
-        return None
 
-    best_match: Dict[str, Any] | None = None
-    best_score = 0.0
-
-    for item in items:
+        # Token-overlap matching (deterministic, no LLM)
         title_text = item.get("title") or item.get("vendor_name") or item.get("name") or ""
         title_tokens = _normalize_tokens(title_text)
-        overlap = len(query_tokens & title_tokens) / max(1, len(query_tokens))
+        overlap = len(query_tokens & title_tokens) / query_len
 
         if overlap >= 0.6 and overlap > best_score:
             best_score = overlap
             best_match = item
+            if overlap == 1.0:
+                # Every query token matched — nothing can score higher.
+                break
+
+    return best_match
+
+
+async def _resolve_entity_uncached(
+    entity_name: str,
+    intent: Dict[str, Any],
+    effective_token: str,
+    cache_key: tuple,
+) -> Dict[str, Any] | None:
+    query_tokens = _normalize_tokens(entity_name)
+    if not query_tokens:
+        return None
+
+    # Local probe first: the entity may already be indexed from an earlier
+    # payload (its own or any other query's) fetched under this token.
+    local = _probe_name_index(entity_name, query_tokens, effective_token)
+    if local is not None:
+        entity = normalize_hotel_entity(local)
+        _ENTITY_CACHE.set(cache_key, entity)
+        return entity
+
+    # Fetch items without ranking so matching sees ALL results, not just
+    # the top-ranked ones. Cached per (query, token) in _fetch_raw_items.
+    try:
+        raw_items = await _fetch_raw_items(entity_name, effective_token)
+    except Exception as e:
+        log.error("resolve_entity API exception: %s", e)
+        return None
+
+    if not raw_items:
+        return None
+
+    # The normalize-and-match pass over up to 200 items is pure Python CPU
+    # work; run it in a worker thread so the event loop stays free for
+    # concurrent requests while one resolution churns.
+    best_match = await asyncio.to_thread(_match_best_item, raw_items, query_tokens)
 
     if best_match:
-        return normalize_hotel_entity(best_match)
+        entity = normalize_hotel_entity(best_match)
+        _ENTITY_CACHE.set(cache_key, entity)
+        return entity
     return None
 
 
+def _fmt_rating(name: str, value: Any) -> str:
+    try:
+        value = float(value)
+        return f"{name} has a {value}-star rating."
+    except Exception:
+        return f"{name} has a rating of {value}."
+
+
+def _fmt_amenities(name: str, value: Any) -> str:
+    if isinstance(value, (list, tuple)) and value:
+        amenities_str = ", ".join(value[:5])  # Limit to first 5
+        if len(value) > 5:
+            amenities_str += f" and {len(value) - 5} more"
+        return f"{name} offers: {amenities_str}."
+    return f"{name} does not have amenities information available."
+
+
+# One formatter per attribute, dispatched in O(1) instead of walking an
+# 18-branch if/elif chain. Each lambda takes (entity name, value) and
+# returns the exact sentence the old chain produced.
+_FORMATTERS: Dict[str, Any] = {
+    "rating": _fmt_rating,
+    "address": lambda n, v: f"{n} is located at {v}.",
+    "phone": lambda n, v: f"{n}'s phone number is {v}.",
+    "amenities": _fmt_amenities,
+    "parking": lambda n, v: f"{n} {'has' if v else 'does not have'} parking available.",
+    "pet_friendly": lambda n, v: f"{n} is {'pet-friendly' if v else 'not pet-friendly'}.",
+    "map": lambda n, v: (
+        f"{n}'s location: {v}" if v
+        else f"{n} does not have location/map information available."
+    ),
+    "wifi": lambda n, v: f"{n} {'has' if v else 'does not have'} WiFi available.",
+    "pool": lambda n, v: f"{n} {'has' if v else 'does not have'} a pool.",
+    "bonfire": lambda n, v: f"{n} {'has' if v else 'does not have'} bonfire facilities.",
+    "google_location": lambda n, v: (
+        f"{n} is located at {v}." if v
+        else f"{n} does not have location information available."
+    ),
+    "website": lambda n, v: (
+        f"{n}'s website is {v}." if v
+        else f"{n} does not have a website listed."
+    ),
+    "kitchen_available": lambda n, v: f"{n} {'has' if v else 'does not have'} a kitchen available.",
+    "food_available": lambda n, v: f"{n} {'has' if v else 'does not have'} food available.",
+    "taxes_included": lambda n, v: f"{n} {'includes' if v else 'does not include'} taxes in the price.",
+    "price_unit": lambda n, v: (
+        f"{n}'s price is per {v}." if v
+        else f"{n} does not have price unit information available."
+    ),
+    "cancellation": lambda n, v: (
+        f"{n}'s cancellation policy: {v}." if v
+        else f"{n} does not have cancellation policy information available."
+    ),
+    "air_conditioned": lambda n, v: (
+        f"{n} has air-conditioned rooms." if v
+        else f"{n} does not have  air-conditioned rooms."
+    ),
+}
+
+
 def format_attribute_answer(entity_data: Dict[str, Any], attribute: str, value: Any) -> str:
     """
     Format a direct factual answer for an entity attribute query.
     """
     entity_name = entity_data.get("name", "This hotel")
-    
+
     # Special handling for price (uses price_from and price_unit, not a single "price" field)
     if attribute == "price":
         price_from = entity_data.get("price_from")
@@ -227,86 +555,21 @@ def format_attribute_answer(entity_data: Dict[str, Any], attribute: str, value:
         if price_from:
             return f"{entity_name}'s price starts from {price_from} {price_unit}.".strip()
         return f"{entity_name} does not have price information available."
-    
+
     if value is None or value == "":
         return f"{entity_name} does not have {attribute} information available."
-    
-    if attribute == "rating":
-        try:
-            value = float(value)
-            return f"{entity_name} has a {value}-star rating."
-        except Exception:
-            return f"{entity_name} has a rating of {value}."
-    
-    if attribute == "address":
-        return f"{entity_name} is located at {value}."
-    
-    if attribute == "phone":
-        return f"{entity_name}'s phone number is {value}."
-    
-    if attribute == "amenities":
-        if isinstance(value, list) and value:
-            amenities_str = ", ".join(value[:5])  # Limit to first 5
-            if len(value) > 5:
-                amenities_str += f" and {len(value) - 5} more"
-            return f"{entity_name} offers: {amenities_str}."
-        return f"{entity_name} does not have amenities information available."
-    
-    if attribute == "parking":
-        return f"{entity_name} {'has' if value else 'does not have'} parking available."
-    
-    if attribute == "pet_friendly":
-        return f"{entity_name} is {'pet-friendly' if value else 'not pet-friendly'}."
-    
-    if attribute == "map":
-        if value:
-            return f"{entity_name}'s location: {value}"
-        return f"{entity_name} does not have location/map information available."
-    
-    if attribute == "wifi":
-        return f"{entity_name} {'has' if value else 'does not have'} WiFi available."
-    
-    if attribute == "pool":
-        return f"{entity_name} {'has' if value else 'does not have'} a pool."
-    
-    if attribute == "bonfire":
-        return f"{entity_name} {'has' if value else 'does not have'} bonfire facilities."
-    
-    if attribute == "google_location":
-        if value:
-            return f"{entity_name} is located at {value}."
-        return f"{entity_name} does not have location information available."
-    
-    if attribute == "website":
-        if value:
-            return f"{entity_name}'s website is {value}."
-        return f"{entity_name} does not have a website listed."
-    
-    if attribute == "kitchen_available":
-        return f"{entity_name} {'has' if value else 'does not have'} a kitchen available."
-    
-    if attribute == "food_available":
-        return f"{entity_name} {'has' if value else 'does not have'} food available."
-    
-    if attribute == "taxes_included":
-        return f"{entity_name} {'includes' if value else 'does not include'} taxes in the price."
-    
-    if attribute == "price_unit":
-        if value:
-            return f"{entity_name}'s price is per {value}."
-        return f"{entity_name} does not have price unit information available."
-    
-    if attribute == "cancellation":
-        if value:
-            return f"{entity_name}'s cancellation policy: {value}."
-        return f"{entity_name} does not have cancellation policy information available."
 
-    if attribute == "air_conditioned":
-       if value:
-        return f"{entity_name} has air-conditioned rooms."
-       return f"{entity_name} does not have  air-conditioned rooms."
+    formatter = _FORMATTERS.get(attribute)
+    if formatter is not None:
+        return formatter(entity_name, value)
+    # Unknown attribute: same as the old chain falling through every branch.
+    return None
 
 
+# search_api calls this for every one of up to 200 items, but the API only
+# has a couple dozen distinct raw categories — cache makes the rule chain
+# run once per unique string instead of once per item.
+@lru_cache(maxsize=512)
 def canonical_category(raw_category: str) -> str:
     if not raw_category:
         return ""
@@ -345,25 +608,10 @@ def canonical_category(raw_category: str) -> str:
     if "shopping" in c:
         return "shopping"
 
-    return c
-
-
-def score_item(item: Dict[str, Any], intent: Dict[str, Any]) -> int:
-    """
-    Simple keyword-based scoring
-    """
-    score = 0
-    text = (
-        f"{item.get('sub_category','')} "
-        f"{item.get('category','')} "
-        f"{item.get('description','')}"
-    ).lower()
-
-    for kw in intent.get("keywords", []):
-        if kw in text:
-            score += 1
-
-    return score
+    # The canonical labels above are compile-time interned literals; intern
+    # the pass-through strings too so every category equality check in the
+    # filters gets the pointer-compare fast path.
+    return sys.intern(c)
 
 
 async def search_api(
@@ -372,54 +620,49 @@ async def search_api(
     page: int = 1,
     limit: int = 30,
     token: str | None = None,
+    category: str | None = None,
 ) -> List[Dict[str, Any]]:
+    """
+    Search with optional category filtering applied inside the
+    normalization pass: `category` keeps only items of that normalized
+    category. Filtering here means off-category rows never reach ranking
+    or the callers' limit window.
+    """
 
     if intent.get("must_have"):
         search_domain = query
     else:
         search_domain = intent.get("search_domain") or query
 
-    params = {
-        "query": search_domain,
-        "page": 1,
-        "limit": 200,
-    }
-
     # Prefer caller-provided Bearer token; fall back to .env token
     effective_token = (token or "").strip() or API_TOKEN
 
-    headers = {
-        "Authorization": f"Bearer {effective_token}",
-        "Accept": "application/json",
-    }
-
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(BASE_URL, params=params, headers=headers)
-            response.raise_for_status()
-            payload = response.json()
+        raw_items = await _fetch_raw_items(search_domain, effective_token)
     except Exception as e:
-        print("[ERROR] search_api exception:", e)
+        log.error("search_api exception: %s", e)
         return []
 
-    # -------------------------------
-    # Extract raw items
-    # -------------------------------
-    raw_items: List[Dict[str, Any]] = []
-
-    if (
-        isinstance(payload, dict)
-        and isinstance(payload.get("data"), dict)
-        and isinstance(payload["data"].get("search_data"), list)
-    ):
-        raw_items = payload["data"]["search_data"]
-
-    print("[DEBUG] RAW API item count:", len(raw_items))
+    log.debug("RAW API item count: %s", len(raw_items))
 
     # -------------------------------
-    # Normalize + image
+    # Normalize + image + keyword score, fused into one pass. Scores live
+    # in (score, item) pairs rather than a transient item["_score"] field,
+    # so cached raw items are never polluted with per-intent state.
     # -------------------------------
-    normalized: List[Dict[str, Any]] = []
+    # One alternation compiled per request replaces the per-keyword
+    # substring loop over every item: a single scan finds every keyword
+    # hit, and the distinct matched keywords give the same score as the
+    # old K-pass version. When intent carries no keywords at all, the
+    # text build and scan are skipped for the whole page.
+    keywords = intent.get("keywords") or []
+    kw_re = None
+    if keywords:
+        kw_re = re.compile(
+            "|".join(sorted({re.escape(k) for k in keywords}, key=len, reverse=True))
+        )
+
+    scored: List[tuple] = []
 
     for item in raw_items:
         if not isinstance(item, dict):
@@ -433,21 +676,27 @@ async def search_api(
             image_path = item["gallery_images"][0]
 
         item["image_url"] = build_image_url(image_path)
-        item["normalized_category"] = canonical_category(item.get("category"))
-        normalized.append(item)
+        normalized_category = canonical_category(item.get("category"))
+        item["normalized_category"] = normalized_category
 
-    # -------------------------------
-    # Intent-based ranking
-    # -------------------------------
-    for item in normalized:
-        item["_score"] = score_item(item, intent)
+        if category is not None and normalized_category != category:
+            continue
 
-    # If keyword matches exist, rank them
-    matched = [i for i in normalized if i["_score"] > 0]
+        score = 0
+        if kw_re is not None:
+            # Scan the three fields directly instead of copying them into
+            # a concatenated f-string first.
+            hits: set = set()
+            for field in (item.get("sub_category"), item.get("category"), item.get("description")):
+                if field:
+                    hits.update(m.group() for m in kw_re.finditer(field.lower()))
+            score = len(hits)
+        scored.append((score, item))
 
-    if matched:
-        matched.sort(key=lambda x: x["_score"], reverse=True)
-        return matched[:limit]
+    # If keyword matches exist, rank them
+    if any(score for score, _ in scored):
+        scored.sort(key=lambda t: t[0], reverse=True)
+        return [item for score, item in scored[:limit] if score > 0]
 
     # If no keyword match, return all normalized items
-    return normalized[:limit]
+    return [item for _, item in scored[:limit]]
@@ -1,20 +1,59 @@
+import asyncio
 import asyncpg
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Every /ask pays up to three DB round-trips (two save_message, one
+# get_recent_messages); a sized persistent pool keeps those on warm
+# connections instead of paying a TCP+TLS handshake per call.
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+
+# Bound on waiting for a free connection when the pool is exhausted, so a
+# stalled database surfaces as a fast TimeoutError instead of a hung request.
+ACQUIRE_TIMEOUT = 2.0
+
 _pool = None
+_pool_lock = asyncio.Lock()
 
-async def get_db_pool():
+
+async def _ping(conn):
+    """Warm-up/liveness probe run on every new pool connection."""
+    await conn.execute("SELECT 1")
+
+
+async def init_db_pool():
+    """Create the pool eagerly (called from app startup).
+
+    min_size connections are opened and pinged up front so the first
+    requests after boot don't pay connection setup.
+    """
     global _pool
 
     if not DATABASE_URL:
         raise RuntimeError("DATABASE_URL environment variable is not set")
 
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                DATABASE_URL,
+                min_size=POOL_MIN_SIZE,
+                max_size=POOL_MAX_SIZE,
+                init=_ping,
+            )
+    return _pool
+
+
+async def close_db_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def get_db_pool():
+    # Lazy fallback for callers outside the app lifecycle (scripts, tests).
     if _pool is None:
-        _pool = await asyncpg.create_pool(
-            DATABASE_URL,
-            min_size=1,
-            max_size=5,
-        )
+        return await init_db_pool()
     return _pool
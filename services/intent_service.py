@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 import re
 
@@ -27,6 +28,24 @@ ATTRIBUTE_KEYWORDS = {
     "air_conditioned": ["ac", "air conditioned", "air-conditioning"]
 }
 
+# Attribute scan compiled once. The lookahead makes matches overlap, so
+# "google location" still also reports "location" (map) exactly like the
+# old per-keyword substring loop; attribute order follows table order.
+_KW_TO_ATTR: Dict[str, str] = {}
+for _attr, _kws in ATTRIBUTE_KEYWORDS.items():
+    for _kw in _kws:
+        _KW_TO_ATTR.setdefault(_kw, _attr)
+_ATTR_RE = re.compile(
+    r"(?=(" + "|".join(sorted(map(re.escape, _KW_TO_ATTR), key=len, reverse=True)) + r"))"
+)
+_ATTR_PRIORITY = {a: i for i, a in enumerate(ATTRIBUTE_KEYWORDS)}
+
+# Action keyword groups, one compiled pattern each (substring semantics).
+_ACTION_LIST_RE = re.compile("show|list|find|search")
+_ACTION_DETAIL_RE = re.compile("tell|about|details")
+_ACTION_GENERAL_RE = re.compile("who are you|what can you do|about yourself|hey|hi")
+
+
 # -----------------------------
 # KEYWORD-TO-DATASET-CATEGORY RESOLVER (fixed mapping, no LLM)
 # Longest phrases first so "wine shop" matches before "wine".
@@ -102,28 +121,49 @@ PHRASE_TO_CATEGORY = (
 )
 
 
+# Compiled once into an overlapping scan: the lookahead finds a phrase at
+# every start position, even inside a longer match elsewhere, so presence
+# detection matches the old one-substring-check-per-phrase loop. The
+# lookahead only captures the longest phrase at each offset, so every
+# match is expanded to the table phrases that prefix it ("wine shops"
+# also counts as "wine shop"). The winner among the phrases found is then
+# picked by the old iteration order (length descending, table order
+# breaking length ties) via _PHRASE_PRIORITY — NOT by position in the
+# query.
+_PHRASE_MAP = dict(PHRASE_TO_CATEGORY)
+_PHRASES_BY_PRIORITY = tuple(
+    p for p, _ in sorted(PHRASE_TO_CATEGORY, key=lambda x: -len(x[0]))
+)
+_PHRASE_PRIORITY = {p: i for i, p in enumerate(_PHRASES_BY_PRIORITY)}
+_PHRASE_PREFIXES = {
+    p: tuple(s for s in _PHRASE_MAP if p.startswith(s)) for p in _PHRASE_MAP
+}
+_PHRASE_RE = re.compile(
+    "(?=(" + "|".join(re.escape(p) for p in _PHRASES_BY_PRIORITY) + "))"
+)
+
+
 def resolve_query_to_category(query: str) -> str | None:
     """Deterministic: map user query to one dataset category. No LLM. Longest phrase first."""
     q = query.lower().strip()
-    # Sort by phrase length descending so "wine shop" matches before "wine"
-    for phrase, category in sorted(PHRASE_TO_CATEGORY, key=lambda x: -len(x[0])):
-        if phrase in q:
-            return category
-    return None
+    hits = {p for m in _PHRASE_RE.finditer(q) for p in _PHRASE_PREFIXES[m.group(1)]}
+    if not hits:
+        return None
+    return _PHRASE_MAP[min(hits, key=_PHRASE_PRIORITY.__getitem__)]
 
 
 # Words that are category-only (list queries, not entity lookup).
-PURE_CATEGORY_WORDS = {
+PURE_CATEGORY_WORDS = frozenset({
     "hotel", "hotels", "resort", "resorts", "villa", "villas",
     "restaurant", "restaurants", "cafe", "cafes", "theater", "theatres",
     "hospital", "hospitals", "office", "offices", "ashram", "ashrams",
     "medical", "lodging", "food", "movies", "cinema", "nashik",
-}
+})
 
 # -----------------------------
 # STOPWORDS (KEEP AS-IS)
 # -----------------------------
-STOPWORDS = {
+STOPWORDS = frozenset({
     "what", "is", "the", "of", "tell", "me", "about",
     "rating", "price", "address", "amenities", "phone",
     "location", "where", "map", "directions",
@@ -132,8 +172,108 @@ STOPWORDS = {
     "wifi", "wi-fi", "internet", "pool", "swimming", "bonfire",
     "website", "site", "url", "kitchen", "food",
     "tax", "taxes", "cancellation", "cancel", "unit"
+})
+
+# -----------------------------
+# CLASSIFICATION TABLE (compiled once, scanned in one pass)
+# keyword/phrase -> (intent field, value). One finditer pass sets the
+# must-have filters and the exploratory flag together instead of a
+# separate substring scan per keyword. Plain alternation (no word
+# boundaries) keeps the old substring semantics, e.g. "pools" still
+# matches "pool".
+# -----------------------------
+_CLASSIFY_MAP = {
+    "pool": ("must_have", "pool"),
+    "family": ("must_have", "family"),
+    "couple": ("must_have", "couple"),
+    "luxury": ("must_have", "luxury"),
+    "budget": ("must_have", "budget"),
+    "cheap": ("must_have", "budget"),
+    # Exploratory (mixed-domain discovery) phrases
+    "fun activities": ("exploratory", True),
+    "things to do": ("exploratory", True),
+    "what to do": ("exploratory", True),
+    "discover": ("exploratory", True),
+    "explore": ("exploratory", True),
+    "experiences": ("exploratory", True),
+    "activities in": ("exploratory", True),
+    "fun in": ("exploratory", True),
+    "something to do": ("exploratory", True),
+    "tourist attractions": ("exploratory", True),
+    "tourist attraction": ("exploratory", True),
+    "tourist spots": ("exploratory", True),
+    "tourist spot": ("exploratory", True),
+    "places to visit": ("exploratory", True),
+    "places to see": ("exploratory", True),
+    "sightseeing": ("exploratory", True),
+    "things to see": ("exploratory", True),
+}
+_CLASSIFY_RE = re.compile(
+    "|".join(re.escape(k) for k in sorted(_CLASSIFY_MAP, key=len, reverse=True))
+)
+
+# -----------------------------
+# DOMAIN KEYWORDS (hoisted from detect_intent — the dict literal used to
+# be rebuilt on every call). Scanned via one compiled alternation; ties
+# between domains resolve in table order like the old first-match loop.
+# -----------------------------
+DOMAIN_KEYWORDS = {
+    "hotel": ["hotel", "hotels", "stay", "stays", "lodging", "accommodation"],
+    "resort": ["resort", "resorts"],
+    "villa": ["villa", "villas"],
+    "restaurant": ["restaurant", "restaurants", "cafe", "cafes", "food", "restaurants & cafes", "eating", "dining", "eat"],
+    "events": ["event", "events", "festival", "festivals", "festivities", "happenings", "events & festivals"],
+    "treks": ["trek", "treks", "hiking", "trekking", "trail", "trails"],
+    "activities": ["activity", "activities", "things to do", "city activities", "city activity", "things to do in city"],
+    "wine": ["wine", "vineyard", "winery", "wineries"],
+    "shopping": ["shopping", "mall", "market", "malls", "markets", "shop", "stores"],
+    "religious": ["temple", "mosque", "church", "religious", "religious services", "worship"],
+    "wellness": ["ayurveda", "spa", "wellness", "ayurvedic", "massage", "retreat", "wellness center", "ayurveda & wellness"],
+    "kids": ["kids", "children", "activities for kids", "kids activities", "children activities", "family activities", "activities for children"],
+    "attractions": ["attraction", "attractions", "places to visit", "places to explore", "places to see", "places to discover"],
+    "visitors": ["visitor", "visitors", "visitor visit", "visitor visits"],
+    "art": ["art", "art gallery", "art galleries", "art museum", "art museums"],
+    "museum": ["museum", "museums", "museum visit", "museum visits"],
+    "history": ["history", "historical", "historical places", "historical places to visit", "historical places to see", "historical places to explore", "historical places to discover"],
+    "hospital": ["healthcare", "hospital", "hospitals", "clinic", "medical", "nursing", "management", "dental", "health", "diagnostic", "pathology", "care center", "iccu", "icu", "selfcare", "emergency", "emergency services", "medical services", "ambulance", "doctor", "pharmacy", "emergency & medical"],
+    "ashram": ["ashram", "ashrams", "ashram visit", "ashram visits"],
+    "office": ["office", "offices", "office visit", "office visits", "virtual office", "virtual offices", "coworking", "coworking space", "workspace"],
+    "theater": ["movie", "movies", "movie theater", "movie theaters", "theater", "theatre", "theaters", "theatres", "cinema"],
+    "adventure": ["adventure", "one-day trip", "day trip", "one day trip", "day trips", "adventure activities", "adventure & one-day trips"],
+    "wildlife": ["wildlife", "nature", "safari", "national park", "nature spots", "wildlife sanctuary", "wildlife & nature", "nature spots"],
+    "picnic": ["picnic", "picnic spot", "picnic spots", "picnic area", "picnic spots"],
+    "tours": ["guided tour", "guided tours", "tours", "tour", "sightseeing", "guided tours"],
+    "today_happenings": ["today's happenings", "today happenings", "what's on today", "whats on today", "going on today", "today events", "happenings today", "today's happenings", "what is happening today"],
 }
 
+_KEYWORD_TO_DOMAIN: Dict[str, str] = {}
+for _domain, _keywords in DOMAIN_KEYWORDS.items():
+    for _kw in _keywords:
+        # First domain listing a keyword wins, like the old scan order.
+        _KEYWORD_TO_DOMAIN.setdefault(_kw, _domain)
+# Overlapping scan (lookahead), so a keyword nested inside a longer keyword
+# of another domain is still detected — "eat" inside "retreat" keeps finding
+# the food domain just like the old per-keyword substring loop. The
+# lookahead only captures the longest keyword at each offset, so each match
+# is expanded to the table keywords that prefix it ("happenings today" also
+# counts as "happenings"), keeping presence detection identical to the old
+# scan.
+_DOMAIN_RE = re.compile(
+    "(?=("
+    + "|".join(sorted(map(re.escape, _KEYWORD_TO_DOMAIN), key=len, reverse=True))
+    + "))"
+)
+_KW_PREFIXES = {
+    kw: tuple(s for s in _KEYWORD_TO_DOMAIN if kw.startswith(s))
+    for kw in _KEYWORD_TO_DOMAIN
+}
+_DOMAIN_PRIORITY = {d: i for i, d in enumerate(DOMAIN_KEYWORDS)}
+
+
+# Candidate entity tokens: words of 3+ letters. Compiled once so detect_intent
+# uses the pattern object directly instead of going through re's cache lookup.
+_ENTITY_TOKEN_RE = re.compile(r"\b[a-zA-Z]{3,}\b")
+
 # Broad tourism → picnic discovery; must run before generic category (hospital, hotel, etc.)
 BROAD_TOURISM = [
     "tourist spot",
@@ -168,11 +308,11 @@ def detect_intent(query: str) -> Dict[str, Any]:
     # -----------------------------
     # Action detection (NEW – SAFE)
     # -----------------------------
-    if any(w in q for w in ["show", "list", "find", "search"]):
+    if _ACTION_LIST_RE.search(q):
         intent["action"] = "list"
-    elif any(w in q for w in ["tell", "about", "details"]):
+    elif _ACTION_DETAIL_RE.search(q):
         intent["action"] = "detail"
-    elif any(w in q for w in ["who are you", "what can you do", "about yourself", "hey", "hi"]):
+    elif _ACTION_GENERAL_RE.search(q):
         intent["action"] = "general"
 
     # -----------------------------
@@ -190,84 +330,45 @@ def detect_intent(query: str) -> Dict[str, Any]:
     if resolved:
         intent["search_domain"] = resolved
     else:
-        DOMAIN_KEYWORDS = {
-            "hotel": ["hotel", "hotels", "stay", "stays", "lodging", "accommodation"],
-            "resort": ["resort", "resorts"],
-            "villa": ["villa", "villas"],
-            "restaurant": ["restaurant", "restaurants", "cafe", "cafes", "food", "restaurants & cafes", "eating", "dining", "eat"],
-            "events": ["event", "events", "festival", "festivals", "festivities", "happenings", "events & festivals"],
-            "treks": ["trek", "treks", "hiking", "trekking", "trail", "trails"],
-            "activities": ["activity", "activities", "things to do", "city activities", "city activity", "things to do in city"],
-            "wine": ["wine", "vineyard", "winery", "wineries"],
-            "shopping": ["shopping", "mall", "market", "malls", "markets", "shop", "stores"],
-            "religious": ["temple", "mosque", "church", "religious", "religious services", "worship"],
-            "wellness": ["ayurveda", "spa", "wellness", "ayurvedic", "massage", "retreat", "wellness center", "ayurveda & wellness"],
-            "kids": ["kids", "children", "activities for kids", "kids activities", "children activities", "family activities", "activities for children"],
-            "attractions": ["attraction", "attractions", "places to visit", "places to explore", "places to see", "places to discover"],
-            "visitors": ["visitor", "visitors", "visitor visit", "visitor visits"],
-            "art": ["art", "art gallery", "art galleries", "art museum", "art museums"],
-            "museum": ["museum", "museums", "museum visit", "museum visits"],
-            "history": ["history", "historical", "historical places", "historical places to visit", "historical places to see", "historical places to explore", "historical places to discover"],
-            "hospital": ["healthcare", "hospital", "hospitals", "clinic", "medical", "nursing", "management", "dental", "health", "diagnostic", "pathology", "care center", "iccu", "icu", "selfcare", "emergency", "emergency services", "medical services", "ambulance", "doctor", "pharmacy", "emergency & medical"],
-            "ashram": ["ashram", "ashrams", "ashram visit", "ashram visits"],
-            "office": ["office", "offices", "office visit", "office visits", "virtual office", "virtual offices", "coworking", "coworking space", "workspace"],
-            "theater": ["movie", "movies", "movie theater", "movie theaters", "theater", "theatre", "theaters", "theatres", "cinema"],
-            "adventure": ["adventure", "one-day trip", "day trip", "one day trip", "day trips", "adventure activities", "adventure & one-day trips"],
-            "wildlife": ["wildlife", "nature", "safari", "national park", "nature spots", "wildlife sanctuary", "wildlife & nature", "nature spots"],
-            "picnic": ["picnic", "picnic spot", "picnic spots", "picnic area", "picnic spots"],
-            "tours": ["guided tour", "guided tours", "tours", "tour", "sightseeing", "guided tours"],
-            "today_happenings": ["today's happenings", "today happenings", "what's on today", "whats on today", "going on today", "today events", "happenings today", "today's happenings", "what is happening today"],
+        found = {
+            _KEYWORD_TO_DOMAIN[kw]
+            for m in _DOMAIN_RE.finditer(q)
+            for kw in _KW_PREFIXES[m.group(1)]
         }
-        for domain, keywords in DOMAIN_KEYWORDS.items():
-            if any(k in q for k in keywords):
-                intent["search_domain"] = domain
-                break
+        if found:
+            intent["search_domain"] = min(found, key=_DOMAIN_PRIORITY.__getitem__)
 
     # -----------------------------
-    # Attribute detection (KEEP)
+    # Attribute detection (KEEP): one overlapping scan, ordered like the
+    # keyword table so the first listed attribute stays first.
     # -----------------------------
-    for attr, keywords in ATTRIBUTE_KEYWORDS.items():
-        if any(k in q for k in keywords):
-            intent["attributes"].append(attr)
+    attr_hits = {_KW_TO_ATTR[m.group(1)] for m in _ATTR_RE.finditer(q)}
+    if attr_hits:
+        intent["attributes"] = sorted(attr_hits, key=_ATTR_PRIORITY.__getitem__)
 
     # -----------------------------
-    # Filters (KEEP + WORKING)
+    # Filters + exploratory flag (KEEP + WORKING)
+    # Single compiled scan over the classification table instead of one
+    # substring pass per keyword/phrase.
     # -----------------------------
-    if "pool" in q:
-        intent["must_have"].append("pool")
-
-    if "family" in q:
-        intent["must_have"].append("family")
-
-    if "couple" in q:
-        intent["must_have"].append("couple")
-
-    if "luxury" in q:
-        intent["must_have"].append("luxury")
-
-    if "budget" in q or "cheap" in q:
-        intent["must_have"].append("budget")
+    intent["exploratory"] = False
+    for m in _CLASSIFY_RE.finditer(q):
+        field, value = _CLASSIFY_MAP[m.group(0)]
+        if field == "must_have":
+            if value not in intent["must_have"]:
+                intent["must_have"].append(value)
+        else:
+            intent[field] = value
 
     # -----------------------------
     # Entity extraction (SAFE)
     # -----------------------------
-    tokens = re.findall(r"\b[a-zA-Z]{3,}\b", q)
+    tokens = _ENTITY_TOKEN_RE.findall(q)
     entity_tokens = [t for t in tokens if t not in STOPWORDS]
 
     if entity_tokens:
         intent["entity"] = " ".join(entity_tokens)
 
-    # -----------------------------
-    # Exploratory (mixed-domain discovery)
-    # -----------------------------
-    exploratory_phrases = [
-        "fun activities", "things to do", "what to do", "discover", "explore",
-        "experiences", "activities in", "fun in", "something to do",
-        "tourist attractions", "tourist attraction", "tourist spots", "tourist spot",
-        "places to visit", "places to see", "sightseeing", "things to see",
-    ]
-    intent["exploratory"] = any(p in q for p in exploratory_phrases)
-
     # -----------------------------
     # Entity lookup vs list (type + entity_name)
     # -----------------------------
@@ -300,12 +401,36 @@ def detect_intent(query: str) -> Dict[str, Any]:
 # BACKWARD COMPATIBILITY (DO NOT REMOVE)
 # ----------------------------------
 
+# detect_intent is a pure function of the query and the same short queries
+# recur constantly, so cache parses keyed on the normalized query. Callers
+# mutate the returned dict, so extract_intent hands out copies.
+@lru_cache(maxsize=512)
+def _detect_intent_cached(normalized_query: str) -> Dict[str, Any]:
+    return detect_intent(normalized_query)
+
+
 def extract_intent(query: str) -> Dict[str, Any]:
-    return detect_intent(query)
+    cached = _detect_intent_cached(query.strip().lower())
+    intent = dict(cached)
+    intent["attributes"] = list(cached["attributes"])
+    intent["must_have"] = list(cached["must_have"])
+    return intent
 
 
 def detect_attribute(query: str) -> Optional[str]:
-    intent = detect_intent(query)
+    intent = _detect_intent_cached(query.strip().lower())
     if intent.get("attributes"):
         return intent["attributes"][0]
     return None
+
+
+def extract_intent_and_attribute(query: str) -> Dict[str, Any]:
+    """Intent and first attribute from a single parse.
+
+    Callers that need both (the /ask handler does on every request)
+    previously made two back-to-back calls; this resolves both from one
+    cached parse.
+    """
+    intent = extract_intent(query)
+    attributes = intent.get("attributes")
+    return {"intent": intent, "attribute": attributes[0] if attributes else None}
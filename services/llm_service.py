@@ -1,28 +1,21 @@
 # services/llm_service.py
 
+import asyncio
 import os
-from typing import Dict
+from typing import Dict, List
 from dotenv import load_dotenv
-from groq import Groq
+from groq import AsyncGroq
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MODEL_NAME = "llama-3.3-70b-versatile"
 
-client = Groq(api_key=GROQ_API_KEY)
+# Async client: completions await on the event loop directly instead of
+# tying up a threadpool worker for the full multi-second LLM latency.
+client = AsyncGroq(api_key=GROQ_API_KEY)
 
-
-async def answer_with_ai(
-    query: str,
-    context: str,
-    intent: Dict,
-    memory: str
-) -> str:
-    if not context or context.strip() == "":
-        return "No matching data found in our listings."
-
-    system_msg = """
+SYSTEM_MSG = """
 You are Anvi AI, a Nashik-based travel assistant.
 
 RULES:
@@ -32,6 +25,93 @@ RULES:
 - Do NOT say phrases like "here is a summary" or "based on the context".
 """
 
+
+class _LLMBatcher:
+    """
+    Continuous micro-batcher for LLM completions.
+
+    Concurrent /ask requests each pay a separate completion round-trip.
+    Submissions queue up and a background worker drains up to MAX_BATCH of
+    them every tick, dispatching the whole batch concurrently. The Groq API
+    is per-request, so the batch is issued as one asyncio.gather over
+    async-client calls; if a true batch-completion endpoint lands, only
+    _dispatch needs to change.
+    """
+
+    MAX_BATCH = 8
+    WAIT_SECONDS = 0.01
+
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._queue
+
+    async def submit(self, messages: list) -> str:
+        queue = self._ensure_worker()
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((future, messages))
+        return await future
+
+    @staticmethod
+    async def _dispatch(messages: list) -> str:
+        # Stream and accumulate: tokens arrive as they are produced, so a
+        # slow tail of generation doesn't hold a whole response buffer
+        # server-side, and cancellation drops the stream early.
+        stream = await client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
+            temperature=0.2,
+            top_p=0.9,
+            stream=True,
+        )
+        parts = []
+        async for chunk in stream:
+            parts.append(chunk.choices[0].delta.content or "")
+        return "".join(parts).strip()
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                while len(batch) < self.MAX_BATCH:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=self.WAIT_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+            results = await asyncio.gather(
+                *(self._dispatch(messages) for _, messages in batch),
+                return_exceptions=True,
+            )
+            for (future, _), result in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+_batcher = _LLMBatcher()
+
+# Most recent history turns forwarded to the model per request.
+MEMORY_TURNS = 10
+
+
+async def answer_with_ai(
+    query: str,
+    context: str,
+    intent: Dict,
+    memory: List[Dict] | None = None
+) -> str:
+    if not context or context.strip() == "":
+        return "No matching data found in our listings."
+
     user_msg = f"""
 USER QUERY:
 {query}
@@ -40,14 +120,18 @@ CONTEXT:
 {context}
 """
 
-    completion = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": user_msg}
-        ],
-        temperature=0.2,
-        top_p=0.9
-    )
-
-    return completion.choices[0].message.content.strip()
+    messages = [{"role": "system", "content": SYSTEM_MSG}]
+
+    # History arrives as structured role/content rows; forward them as chat
+    # turns instead of flattening into a prompt string — no join allocation
+    # and the model sees proper conversation structure.
+    if memory:
+        messages.extend(
+            {"role": m["role"], "content": m["content"]}
+            for m in memory[-MEMORY_TURNS:]
+            if m.get("role") in ("user", "assistant") and m.get("content")
+        )
+
+    messages.append({"role": "user", "content": user_msg})
+
+    return await _batcher.submit(messages)
@@ -1,25 +1,163 @@
-from services.db import get_db_pool
+import asyncio
+import logging
+
+from services.db import ACQUIRE_TIMEOUT, get_db_pool
+from utils.cache import TTLCache
+
+log = logging.getLogger("anvi.memory")
 
 MAX_HISTORY = 10
 
+# Batch writes: save_message enqueues and a background task flushes in bulk
+# (every FLUSH_INTERVAL seconds or FLUSH_MAX messages), so the request path
+# never waits on an INSERT round-trip and the DB sees one executemany
+# instead of a row-at-a-time stream.
+FLUSH_MAX = 100
+FLUSH_INTERVAL = 0.05
 
-async def save_message(app_user_id: str, role: str, content: str):
+# Back-pressure bound: if the flusher falls this far behind, writers stop
+# enqueueing and write through directly instead of growing the queue.
+QUEUE_MAX = 1000
+
+_INSERT_SQL = """
+    INSERT INTO chat_messages (app_user_id, role, content)
+    VALUES ($1, $2, $3)
+"""
+
+_queue: asyncio.Queue | None = None
+_flusher_task: asyncio.Task | None = None
+_flush_lock = asyncio.Lock()
+
+# Rows the flusher has taken off the queue but not yet committed. Rows
+# only ever move from the queue into this list synchronously (get_nowait
+# plus append, no await in between), so at every await point each saved
+# message is visible in exactly one of the two places — _flush_pending
+# (and therefore get_recent_messages) can never miss a row the flusher
+# is still holding.
+_pending_batch: list[tuple] = []
+
+# Recent-message reads repeat within a request/session far more often than
+# writes land. Cache reads keyed by a per-user version counter that every
+# write bumps, so a save transparently invalidates all cached reads for
+# that user without scanning keys.
+_HISTORY_CACHE = TTLCache(maxsize=2048, ttl=60)
+_history_versions: dict[str, int] = {}
+
+
+def _get_queue() -> asyncio.Queue:
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=QUEUE_MAX)
+    return _queue
+
+
+async def _flush(batch: list[tuple]) -> None:
     pool = await get_db_pool()
-    async with pool.acquire() as conn:
-        await conn.execute(
-            """
-            INSERT INTO chat_messages (app_user_id, role, content)
-            VALUES ($1, $2, $3)
-            """,
-            app_user_id,
-            role,
-            content
-        )
+    async with pool.acquire(timeout=ACQUIRE_TIMEOUT) as conn:
+        await conn.executemany(_INSERT_SQL, batch)
+
+
+async def _flush_pending() -> None:
+    """Write everything queued or mid-flush right now in one batch."""
+    queue = _get_queue()
+    async with _flush_lock:
+        while not queue.empty():
+            _pending_batch.append(queue.get_nowait())
+        if _pending_batch:
+            batch = _pending_batch[:]
+            await _flush(batch)
+            # The flusher may have moved new rows in while the INSERT ran;
+            # only remove what was actually written.
+            del _pending_batch[:len(batch)]
+
+
+async def _flusher_loop() -> None:
+    queue = _get_queue()
+    while True:
+        if not _pending_batch:
+            # Wake-up row. put_nowait lands the row in the queue before
+            # this resumes, and the pop + append happen in one scheduler
+            # step, so the row is never invisibly in flight. (A reader's
+            # _flush_pending may steal it first; get just waits again.)
+            _pending_batch.append(await queue.get())
+        if len(_pending_batch) < FLUSH_MAX:
+            # One batching window for more writes to pile on, then drain
+            # whatever is immediately available. An awaited get here
+            # would hide the row inside wait_for's wrapper task between
+            # dequeue and append; get_nowait keeps the transfer atomic.
+            await asyncio.sleep(FLUSH_INTERVAL)
+            while len(_pending_batch) < FLUSH_MAX and not queue.empty():
+                _pending_batch.append(queue.get_nowait())
+        try:
+            async with _flush_lock:
+                if not _pending_batch:
+                    # A reader's _flush_pending wrote the batch for us
+                    # while we waited for the lock.
+                    continue
+                batch = _pending_batch[:]
+                await _flush(batch)
+                del _pending_batch[:len(batch)]
+        except Exception:
+            # A transient DB error must not kill the flusher for the rest
+            # of the process. The rows stay in _pending_batch — still
+            # visible to readers — and are retried on the next pass; cap
+            # the backlog so a down database can't grow it without bound.
+            log.exception("flush of %d message(s) failed; will retry", len(_pending_batch))
+            if len(_pending_batch) > QUEUE_MAX:
+                dropped = len(_pending_batch) - QUEUE_MAX
+                del _pending_batch[:dropped]
+                log.error("dropping %d oldest unflushed message(s)", dropped)
+            # Back off so a down database doesn't spin this loop hot.
+            await asyncio.sleep(1.0)
+
+
+def start_flusher() -> None:
+    """Spawn the background flusher. Call once from app startup."""
+    global _flusher_task
+    if _flusher_task is None:
+        _flusher_task = asyncio.create_task(_flusher_loop())
+
+
+async def stop_flusher() -> None:
+    """Cancel the flusher and persist anything still queued."""
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_task.cancel()
+        try:
+            await _flusher_task
+        except asyncio.CancelledError:
+            pass
+        _flusher_task = None
+    await _flush_pending()
+
+
+async def save_message(app_user_id: str, role: str, content: str):
+    if _flusher_task is None:
+        # No flusher running (scripts, tests) — write through directly.
+        await _flush([(app_user_id, role, content)])
+    else:
+        try:
+            _get_queue().put_nowait((app_user_id, role, content))
+        except asyncio.QueueFull:
+            # Flusher is badly behind; take the hit inline rather than
+            # letting the backlog grow without bound.
+            await _flush([(app_user_id, role, content)])
+    _history_versions[app_user_id] = _history_versions.get(app_user_id, 0) + 1
 
 
 async def get_recent_messages(app_user_id: str, limit: int = MAX_HISTORY):
+    version = _history_versions.get(app_user_id, 0)
+    cache_key = (app_user_id, limit, version)
+    cached = _HISTORY_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Make sure queued writes (including this request's own user message)
+    # are visible before reading.
+    await _flush_pending()
+
     pool = await get_db_pool()
-    async with pool.acquire() as conn:
+    async with pool.acquire(timeout=ACQUIRE_TIMEOUT) as conn:
         rows = await conn.fetch(
             """
             SELECT role, content
@@ -32,7 +170,9 @@ async def get_recent_messages(app_user_id: str, limit: int = MAX_HISTORY):
             limit
         )
 
-    return [
+    messages = [
         {"role": r["role"], "content": r["content"]}
         for r in reversed(rows)
     ]
+    _HISTORY_CACHE.set(cache_key, messages)
+    return messages
@@ -1,14 +1,63 @@
 # services/rag_service.py
 
 import asyncio
+import hashlib
+import os
+import re
+import sys
+from functools import lru_cache
 from typing import List, Dict
 
+import orjson
+
+from services import semantic_cache
 from services.data_service import search_api
+from utils.cache import TTLCache
+
+# Optional shared L2 behind the in-process cache: with several uvicorn
+# workers, one worker's computed results serve them all. Active only when
+# REDIS_URL is set and the redis package is importable; every L2 failure
+# degrades silently to L1-only behavior.
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis not installed — L1 only
+    aioredis = None
+
+REDIS_URL = os.getenv("REDIS_URL", "")
+L2_TTL = 300
+
+_redis = None
+
+
+def _get_redis():
+    global _redis
+    if _redis is None and aioredis is not None and REDIS_URL:
+        _redis = aioredis.from_url(REDIS_URL)
+    return _redis
+
+
+def _l2_key(cache_key: tuple) -> str:
+    digest = hashlib.sha1("|".join(map(str, cache_key)).encode()).hexdigest()
+    return f"rag:{digest}"
 
 MAX_RESULTS = 8  # keep your existing window
+DESC_MAX = 200  # description clamp for context lines
+
+# Filtered result lists for hot queries: repeats within a session skip the
+# whole search + filter pipeline. get_rag_context shares this through its
+# get_rag_items delegation (context is formatted on demand from the items).
+_RAG_CACHE = TTLCache(maxsize=256, ttl=300)
+
+# Empty results are cached too (stampede guard for typo keywords), but only
+# briefly so real data appearing upstream isn't masked for long.
+NEGATIVE_TTL = 30
+
+# In-flight computations keyed like the cache: concurrent misses for the
+# same query await one shared task instead of each hitting search_api.
+_RAG_INFLIGHT: Dict[tuple, asyncio.Task] = {}
 
 # Exploratory: only these categories. Never hotel, hospital, office, resort, villa.
-ALLOWED_EXPLORATORY = {
+ALLOWED_EXPLORATORY = frozenset({
     "museum",
     "theater",
     "treks",
@@ -19,165 +68,273 @@ ALLOWED_EXPLORATORY = {
     "restaurant",
     "shopping",
     "wine",
-}
-
-
+})
+
+
+# Category rules in the priority order the old if/elif chain checked them:
+# (needle, canonical) pairs. A single compiled scan finds every needle in
+# the raw string; the earliest-listed rule among the hits decides, so
+# precedence (hotel before resort, trek before adventure, ...) is kept.
+_CAT_RULES = (
+    ("hotel", "hotel"),
+    ("resort", "resort"),
+    ("villa", "villa"),
+    ("restaurant", "restaurant"),
+    ("cafe", "restaurant"),
+    ("medical", "hospital"),
+    ("hospital", "hospital"),
+    ("office", "office"),
+    ("theater", "theater"),
+    ("museum", "museum"),
+    ("religious", "religious"),
+    ("mandir", "religious"),
+    ("temple", "religious"),
+    ("ashram", "religious"),
+    ("trek", "treks"),
+    ("adventure", "adventure"),
+    ("one-day", "adventure"),
+    ("wildlife", "wildlife"),
+    ("nature", "wildlife"),
+    ("picnic", "picnic"),
+    ("wine", "wine"),
+    ("shopping", "shopping"),
+)
+_CAT_MAP = dict(_CAT_RULES)
+_CAT_PRIORITY = {needle: i for i, (needle, _) in enumerate(_CAT_RULES)}
+_CAT_RE = re.compile(
+    "|".join(sorted((re.escape(n) for n, _ in _CAT_RULES), key=len, reverse=True))
+)
+
+
+# Raw labels have very low cardinality (dozens of distinct strings across
+# thousands of items), so steady-state calls are a dict probe.
+@lru_cache(maxsize=2048)
 def normalize_category(raw_category: str) -> str:
     if not raw_category:
         return ""
 
     c = raw_category.lower().strip()
 
-    # Hotels
-    if "hotel" in c:
-        return "hotel"
-    if "resort" in c:
-        return "resort"
-    if "villa" in c:
-        return "villa"
-
-    # Restaurants / Cafes
-    if "restaurant" in c or "cafe" in c:
-        return "restaurant"
-
-    # Hospitals
-    if "medical" in c or "hospital" in c:
-        return "hospital"
-
-    # Offices
-    if "office" in c:
-        return "office"
-
-    # Theaters
-    if "theater" in c:
-        return "theater"
-
-    # Museums
-    if "museum" in c:
-        return "museum"
-
-    # Religious
-    if "religious" in c or "mandir" in c or "temple" in c or "ashram" in c:
-        return "religious"
-
-    # Adventure / Treks / One Day
-    if "trek" in c:
-        return "treks"
-    if "adventure" in c or "one-day" in c:
-        return "adventure"
+    hits = {m.group(0) for m in _CAT_RE.finditer(c)}
+    if hits:
+        return _CAT_MAP[min(hits, key=_CAT_PRIORITY.__getitem__)]
 
-    # Wildlife
-    if "wildlife" in c or "nature" in c:
-        return "wildlife"
+    # Canonical labels are interned literals; intern pass-throughs too so
+    # category comparisons get the pointer-compare fast path.
+    return sys.intern(c)
 
-    # Picnic
-    if "picnic" in c:
-        return "picnic"
 
-    # Wine
-    if "wine" in c:
-        return "wine"
-
-    # Shopping
-    if "shopping" in c:
-        return "shopping"
-
-    return c
-
-
-def _item_category(item: Dict) -> str:
-    """Item category from ingestion (normalized_category)."""
-    return item.get("normalized_category", "")
+# One specialized predicate per (exploratory, category) pair, cached so a
+# session reusing the same intent shape pays the branch and string
+# normalization once, not per item.
+@lru_cache(maxsize=128)
+def make_filter(exploratory: bool, category: str):
+    """Build the per-item category predicate for an intent shape."""
+    # normalized_category is produced stripped at ingestion, so no
+    # per-item strip() is needed in the closures.
+    if exploratory:
+        return lambda item: (item.get("normalized_category") or "") in ALLOWED_EXPLORATORY
+    if category:
+        return lambda item: (item.get("normalized_category") or "") == category
+    return lambda item: True
 
 
 def _matches_intent_category(item: Dict, intent: Dict) -> bool:
     """
     Strict category filter when not exploratory.
-    Exploratory: allow all items with non-empty normalized_category.
+    Exploratory: allow only the allowlisted categories.
     """
-    item_category = (item.get("normalized_category") or "").strip()
-
-    if intent.get("exploratory"):
-        return bool(item_category)
-
-    intent_category = (intent.get("search_domain") or "").lower().strip()
-    if intent_category and item_category != intent_category:
-        return False
-    return True
-
-
-async def _format_item(item: Dict, index: int) -> str:
-    name = item.get("vendor_name") or item.get("name") or "Unknown"
-    category = item.get("category") or item.get("type") or ""
-    area = item.get("area_name") or item.get("zone_name") or item.get("area") or ""
-    rating = item.get("rating") or item.get("star_rating") or ""
-    address = (
-        item.get("address")
-        or item.get("location")
-        or item.get("area_name")
-        or ""
-    )
-    desc = item.get("short_description") or item.get("description") or ""
-
-    if desc and len(desc) > 200:
-        desc = desc[:200].rstrip() + "..."
-
-    return (
-        f"[{index}]\n"
-        f"Name: {name}\n"
-        f"Category: {category}\n"
-        f"Area: {area}\n"
-        f"Rating: {rating}\n"
-        f"Address: {address}\n"
-        f"Description: {desc}\n"
-        f"----"
-    )
+    return make_filter(
+        bool(intent.get("exploratory")),
+        (intent.get("search_domain") or "").lower().strip(),
+    )(item)
+
+
+# Context-line template built once; each item fills it via one format_map
+# call instead of re-assembling eight f-string pieces.
+_ITEM_TMPL = (
+    "[{i}]\n"
+    "Name: {name}\n"
+    "Category: {category}\n"
+    "Area: {area}\n"
+    "Rating: {rating}\n"
+    "Address: {address}\n"
+    "Description: {desc}\n"
+    "----"
+)
+
+
+# Field aliases in fallback order, shared by every formatted item.
+_NAME_KEYS = ("vendor_name", "name")
+_CATEGORY_KEYS = ("category", "type")
+_AREA_KEYS = ("area_name", "zone_name", "area")
+_RATING_KEYS = ("rating", "star_rating")
+_ADDR_KEYS = ("address", "location", "area_name")
+_DESC_KEYS = ("short_description", "description")
+
+
+def _first(item: Dict, keys: tuple, default: str = ""):
+    """First truthy value among the aliased keys, like the old or-chains."""
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return default
+
+
+def _format_item(item: Dict, index: int) -> str:
+    desc = _first(item, _DESC_KEYS)
+    if len(desc) > DESC_MAX:
+        desc = desc[:DESC_MAX].rstrip() + "..."
+
+    return _ITEM_TMPL.format_map({
+        "i": index,
+        "name": _first(item, _NAME_KEYS, "Unknown"),
+        "category": _first(item, _CATEGORY_KEYS),
+        "area": _first(item, _AREA_KEYS),
+        "rating": _first(item, _RATING_KEYS),
+        "address": _first(item, _ADDR_KEYS),
+        "desc": desc,
+    })
 
 
 async def get_rag_context(keyword: str, session_id: str, intent: Dict) -> str:
     """
     RAG context builder with STRICT domain filtering.
     LLM does NOT decide filtering.
-    """
 
-    items = await search_api(keyword, intent, limit=30)
+    Delegates retrieval + filtering to get_rag_items so callers that need
+    both the context string and the item list only hit the search API once.
+    """
 
-    if not items:
+    if not keyword or not keyword.strip():
         return ""
 
-    # ---------------- CATEGORY FILTER ----------------
-    if intent.get("exploratory"):
-        items = [i for i in items if (i.get("normalized_category") or "").strip()]
-    else:
-        intent_category = (intent.get("search_domain") or "").lower().strip()
-        if intent_category:
-            items = [i for i in items if (i.get("normalized_category") or "").strip() == intent_category]
+    items = await get_rag_items(keyword, intent)
 
     if not items:
         return ""
 
-    filtered = [i for i in items if _matches_intent_category(i, intent)]
+    selected = items[:MAX_RESULTS]
 
-    if not filtered:
-        return ""
-
-    selected = filtered[:MAX_RESULTS]
-
-    formatted = await asyncio.gather(
-        *[_format_item(item, idx + 1) for idx, item in enumerate(selected)]
-    )
-
-    return "\n".join(formatted).strip()
+    # Pure string work — no awaits — so format inline. The template starts
+    # and ends with non-whitespace, so no trailing strip() pass is needed
+    # over the joined output.
+    parts = [_format_item(item, idx + 1) for idx, item in enumerate(selected)]
+    return "\n".join(parts)
 
 
 async def get_rag_items(keyword: str, intent: Dict) -> List[Dict]:
-    items = await search_api(keyword, intent, limit=30)
-
-    if intent.get("exploratory"):
-        items = [i for i in items if (i.get("normalized_category") or "").strip()]
+    # A blank keyword would still cost a full network round trip just to
+    # return junk; answer it locally.
+    if not keyword or not keyword.strip():
+        return []
+
+    cache_key = (
+        keyword.strip().lower(),
+        (intent.get("search_domain") or "").lower(),
+        bool(intent.get("exploratory")),
+    )
+    cached = _RAG_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Exact-key misses still hit on paraphrases ("museums in nashik" /
+    # "nashik museum"): probe the token-Jaccard semantic cache under a
+    # rag-scoped tag so entries never mix with the answer cache's.
+    sem_tag = f"rag|{cache_key[1]}|{cache_key[2]}"
+    near = semantic_cache.lookup(keyword, sem_tag)
+    if near is not None:
+        return near
+
+    # Coalesce concurrent misses for the same key onto one computation,
+    # same singleflight pattern as entity resolution.
+    inflight = _RAG_INFLIGHT.get(cache_key)
+    if inflight is not None:
+        return await inflight
+
+    task = asyncio.ensure_future(
+        _get_rag_items_uncached(keyword, intent, cache_key, sem_tag)
+    )
+    _RAG_INFLIGHT[cache_key] = task
+    try:
+        return await task
+    finally:
+        _RAG_INFLIGHT.pop(cache_key, None)
+
+
+async def _get_rag_items_uncached(
+    keyword: str,
+    intent: Dict,
+    cache_key: tuple,
+    sem_tag: str,
+) -> List[Dict]:
+    # L2: another worker may already have computed this.
+    redis_client = _get_redis()
+    if redis_client is not None:
+        try:
+            raw = await redis_client.get(_l2_key(cache_key))
+        except Exception:
+            raw = None
+        if raw is not None:
+            items = orjson.loads(raw)
+            _RAG_CACHE.set(cache_key, items)
+            return items
+
+    # Category rules run inside search_api's normalization pass, so
+    # off-category rows never occupy the limit window and no post-filter
+    # scan is needed here. Exploratory queries fan out one category-scoped
+    # search per allowlisted domain (never hotel, hospital, office, resort,
+    # villa) — each sub-search is a cacheable, precise query instead of one
+    # wide mixed bag.
+    exploratory = bool(intent.get("exploratory"))
+    # Interned once per query; item categories are interned at ingestion,
+    # so the equality filter compares pointers first.
+    intent_category = sys.intern((intent.get("search_domain") or "").lower().strip())
+    if exploratory:
+        results = await asyncio.gather(
+            *(
+                search_api(
+                    keyword,
+                    {**intent, "search_domain": c},
+                    limit=MAX_RESULTS,
+                    category=c,
+                )
+                for c in sorted(ALLOWED_EXPLORATORY)
+            )
+        )
+        items = []
+        seen: set = set()
+        for batch in results:
+            for item in batch:
+                dedupe_key = item.get("vendor_id") or item.get("table_id")
+                if dedupe_key is not None:
+                    if dedupe_key in seen:
+                        continue
+                    seen.add(dedupe_key)
+                items.append(item)
+                if len(items) >= MAX_RESULTS:
+                    break
+            if len(items) >= MAX_RESULTS:
+                break
     else:
-        intent_category = (intent.get("search_domain") or "").lower().strip()
-        if intent_category:
-            items = [i for i in items if (i.get("normalized_category") or "").strip() == intent_category]
-
-    return [i for i in items if _matches_intent_category(i, intent)]
\ No newline at end of file
+        items = await search_api(
+            keyword,
+            intent,
+            limit=MAX_RESULTS * 2,
+            category=intent_category if intent_category else None,
+        )
+    if items:
+        _RAG_CACHE.set(cache_key, items)
+        semantic_cache.store(keyword, sem_tag, items)
+        if redis_client is not None:
+            try:
+                await redis_client.set(_l2_key(cache_key), orjson.dumps(items), ex=L2_TTL)
+            except Exception:
+                pass
+    else:
+        # Negative entry: a hammered typo keyword shouldn't re-hit the API
+        # on every attempt, but an empty answer also shouldn't stick around
+        # for the full TTL (or spread to paraphrases via the semantic tier).
+        _RAG_CACHE.set(cache_key, items, ttl=NEGATIVE_TTL)
+    return items
\ No newline at end of file
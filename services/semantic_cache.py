@@ -0,0 +1,90 @@
+# services/semantic_cache.py
+
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Near-duplicate queries ("hotels in nashik" / "nashik hotels") recompute the
+# full search + LLM chain. Cache finished answers keyed by the query's token
+# set and serve repeats via token-overlap (Jaccard) matching — a cache hit
+# skips the RAG fetch AND the LLM call entirely.
+#
+# Candidates are found through per-token posting lists (one dict probe per
+# query token) rather than scanning every entry, so lookup stays cheap even
+# when the cache is full.
+
+SIM_THRESHOLD = 0.9
+TTL_SECONDS = 300
+MAX_ENTRIES = 256
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# key -> (token_set, domain, payload, stored_at)
+_entries: "OrderedDict[str, tuple]" = OrderedDict()
+# token -> set of entry keys containing that token
+_postings: Dict[str, set] = {}
+
+
+def _tokenize(query: str) -> frozenset:
+    return frozenset(_TOKEN_RE.findall(query.lower()))
+
+
+def _evict(key: str) -> None:
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return
+    for token in entry[0]:
+        keys = _postings.get(token)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _postings[token]
+
+
+def lookup(query: str, domain: str) -> Optional[Dict[str, Any]]:
+    """Return a cached payload for a near-identical query, or None."""
+    tokens = _tokenize(query)
+    if not tokens:
+        return None
+
+    now = time.monotonic()
+    candidates = set()
+    for token in tokens:
+        candidates.update(_postings.get(token, ()))
+
+    best_key = None
+    best_sim = 0.0
+    for key in candidates:
+        entry_tokens, entry_domain, payload, stored_at = _entries[key]
+        if entry_domain != domain:
+            continue
+        if now - stored_at > TTL_SECONDS:
+            continue
+        sim = len(tokens & entry_tokens) / len(tokens | entry_tokens)
+        if sim >= SIM_THRESHOLD and sim > best_sim:
+            best_sim = sim
+            best_key = key
+
+    if best_key is None:
+        return None
+    return _entries[best_key][2]
+
+
+def store(query: str, domain: str, payload: Dict[str, Any]) -> None:
+    """Cache a finished (answer, cards) payload for this query."""
+    tokens = _tokenize(query)
+    if not tokens:
+        return
+
+    key = f"{domain}|{' '.join(sorted(tokens))}"
+    if key in _entries:
+        _evict(key)
+
+    while len(_entries) >= MAX_ENTRIES:
+        oldest_key = next(iter(_entries))
+        _evict(oldest_key)
+
+    _entries[key] = (tokens, domain, payload, time.monotonic())
+    for token in tokens:
+        _postings.setdefault(token, set()).add(key)